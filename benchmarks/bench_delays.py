@@ -0,0 +1,87 @@
+"""Micro-benchmark: board delay classification, strptime vs the delays.py lookup table.
+
+Run from the repo root:
+    python -m benchmarks.bench_delays [trains_per_board] [boards]
+"""
+import random
+import sys
+import time
+from datetime import datetime
+
+from src import delays
+
+
+def legacy_classify(sta, eta):
+    # The pre-delays.py logic from rail_service.parse_board, kept for comparison
+    status = "On Time"
+    delay_minutes = 0
+    if eta == "Cancelled":
+        status = "Cancelled"
+        delay_minutes = 60
+    elif eta == "On time":
+        status = "On Time"
+        delay_minutes = 0
+    elif eta and ":" in eta and sta and ":" in sta:
+        try:
+            t_sta = datetime.strptime(sta, "%H:%M")
+            t_eta = datetime.strptime(eta, "%H:%M")
+            diff_mins = (t_eta - t_sta).total_seconds() / 60.0
+            if diff_mins < -720: diff_mins += 1440
+            delay_minutes = max(0, int(diff_mins))
+            if delay_minutes > 0: status = "Delayed"
+        except (ValueError, TypeError):
+            delay_minutes = 0
+    return status, delay_minutes
+
+
+def synthetic_board(n, rng):
+    scheduled, estimated = [], []
+    for _ in range(n):
+        sched = rng.randrange(1440)
+        kind = rng.random()
+        if kind < 0.5:
+            eta = "On time"
+        elif kind < 0.6:
+            eta = "Cancelled"
+        elif kind < 0.65:
+            eta = "Delayed"
+        else:
+            late = (sched + rng.randint(-3, 45)) % 1440
+            eta = f"{late // 60:02d}:{late % 60:02d}"
+        scheduled.append(f"{sched // 60:02d}:{sched % 60:02d}")
+        estimated.append(eta)
+    return scheduled, estimated
+
+
+def best_of(repeats, fn):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(trains_per_board=50, boards=2000, repeats=5):
+    rng = random.Random(42)
+    data = [synthetic_board(trains_per_board, rng) for _ in range(boards)]
+    total = trains_per_board * boards
+
+    # Sanity check: same delays as the old implementation (except the "Delayed" state, now DELAYED with 0 mins)
+    for scheduled, estimated in data[:50]:
+        _, new_delays = delays.classify_many(scheduled, estimated)
+        old_delays = [legacy_classify(s, e)[1] for s, e in zip(scheduled, estimated)]
+        assert list(new_delays) == old_delays
+
+    legacy = best_of(repeats, lambda: [[legacy_classify(s, e) for s, e in zip(*board)] for board in data])
+    per_train = best_of(repeats, lambda: [[delays.classify(s, e) for s, e in zip(*board)] for board in data])
+    batched = best_of(repeats, lambda: [delays.classify_many(*board) for board in data])
+
+    print(f"{boards} boards x {trains_per_board} trains = {total} trains (best of {repeats})")
+    for name, seconds in (("strptime (legacy)", legacy), ("classify", per_train), ("classify_many", batched)):
+        print(f"  {name:<18} {seconds * 1000:8.1f} ms  {seconds / total * 1e9:7.0f} ns/train  x{legacy / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,83 @@
+"""Micro-benchmark: response serialization cost per 1k items, default FastAPI path vs FAST_JSON.
+
+Run from the repo root:
+    python -m benchmarks.bench_serialization [items]
+"""
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src import ingestion, schemas, serialization
+from src.rail_service import parse_board
+
+
+INCIDENT_FIELDS = tuple(schemas.IncidentResponse.model_fields)  # as selected by /incidents/my-reports
+
+
+def synthetic_incidents(n, rng):
+    owner = uuid.uuid4()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        dict(zip(INCIDENT_FIELDS, (
+            rng.choice(["LDS", "MAN", "KGX", "YRK"]), f"T{i:05d}", rng.choice(["Crowding", "Delay", "Facilities"]),
+            rng.randint(1, 5), "Synthetic report", uuid.uuid4(), owner, start + timedelta(seconds=i),
+        )))
+        for i in range(n)
+    ]
+
+
+def fastapi_default(adapter, rows):
+    # What a response_model route does: validate, dump to JSON-able data, then json.dumps (JSONResponse.render)
+    content = jsonable_encoder(adapter.dump_python(adapter.validate_python(rows), mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def best_of(repeats, fn):
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(title, items, results):
+    baseline = results[0][1]
+    print(f"{title} ({items} items)")
+    for name, seconds in results:
+        print(f"  {name:<28} {seconds / items * 1e6:8.1f} ms/1k  x{baseline / seconds:5.1f}")
+
+
+def main(items=1000, repeats=20):
+    rng = random.Random(42)
+    print(f"orjson: {'installed' if serialization.orjson is not None else 'missing (stdlib json fallback)'}")
+
+    incidents = synthetic_incidents(items, rng)
+    incident_adapter = TypeAdapter(List[schemas.IncidentResponse])
+    assert json.loads(serialization.dumps(incidents)) == json.loads(fastapi_default(incident_adapter, incidents))
+    report("Incident listing", items, [
+        ("response_model (default)", best_of(repeats, lambda: fastapi_default(incident_adapter, incidents))),
+        ("serialization.dumps", best_of(repeats, lambda: serialization.dumps(incidents))),
+    ])
+
+    board = parse_board(ingestion.StubUpstream(trains_per_board=items).payload("BEN"), "BEN")
+    rows = board.rows()
+    train_adapter = TypeAdapter(List[schemas.TrainResponse])
+    assert json.loads(board.to_json()) == json.loads(fastapi_default(train_adapter, rows))
+    report("Live board", items, [
+        ("response_model (default)", best_of(repeats, lambda: fastapi_default(train_adapter, rows))),
+        ("Board.to_json", best_of(repeats, board.to_json)),
+        ("dumps(board.rows())", best_of(repeats, lambda: serialization.dumps(board.rows()))),
+    ])
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    main(*args)
@@ -0,0 +1,72 @@
+"""Seeded incident dataset generator for load tests (Postgres or SQLite, whatever DATABASE_URL points at).
+
+Run from the repo root:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.dataset --users 200 --incidents 100000 --hours 24
+
+Users are bench_user_<n>@railpulse.test with password workload.BENCH_PASSWORD, so load scenarios can log in.
+The same seed always produces the same rows.
+"""
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from src import auth, database, models, rollups
+
+from .workload import BENCH_PASSWORD, bench_email, synthetic_report
+
+CHUNK = 5000
+
+
+def seed_database(users=200, incidents=100_000, hours=24, seed=42):
+    rng = random.Random(seed)
+    models.Base.metadata.create_all(bind=database.engine)
+    # One bcrypt hash shared by every user; hashing each would dominate the run
+    hashed = auth.pwd_context.hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(hours=hours)
+
+    user_rows = [
+        {"id": uuid.UUID(int=rng.getrandbits(128)), "email": bench_email(n), "hashed_password": hashed, "is_active": True}
+        for n in range(users)
+    ]
+    span = (now - start).total_seconds()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), user_rows)
+        for offset in range(0, incidents, CHUNK):
+            rows = []
+            for _ in range(min(CHUNK, incidents - offset)):
+                rows.append({
+                    **synthetic_report(rng),
+                    "id": uuid.UUID(int=rng.getrandbits(128)),
+                    "owner_id": rng.choice(user_rows)["id"],
+                    "created_at": start + timedelta(seconds=rng.random() * span),
+                })
+            conn.execute(insert(models.Incident.__table__), rows)
+
+    # Rollups for the seeded window (the live write path keeps them in step afterwards)
+    db = database.SessionLocal()
+    try:
+        rollups.backfill(db, start)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--incidents", type=int, default=100_000)
+    parser.add_argument("--hours", type=float, default=24, help="spread reports over the last N hours")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed_database(args.users, args.incidents, args.hours, args.seed)
+    print(f"Seeded {args.users} users and {args.incidents} incidents in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
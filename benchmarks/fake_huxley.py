@@ -0,0 +1,69 @@
+"""Local stand-in for the Huxley API: synthetic or recorded boards with configurable latency and size.
+
+Run from the repo root, then point the API at it:
+    python -m benchmarks.fake_huxley --port 8081 --trains 50 --latency-ms 120 --jitter-ms 40
+    HUXLEY_BASE_URL=http://127.0.0.1:8081 uvicorn src.main:app
+
+Recorded boards are raw Huxley JSON responses saved as <DIR>/<CRS>.json (--recorded DIR);
+stations without a recording get a synthetic board.
+"""
+import argparse
+import asyncio
+import json
+import random
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+
+from src.ingestion import StubUpstream
+
+
+def create_app(trains=50, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, recorded=None, seed=0):
+    app = FastAPI(title="Fake Huxley")
+    stub = StubUpstream(trains_per_board=trains, seed=seed)
+    rng = random.Random(seed)
+    recordings = {}
+    if recorded:
+        recordings = {path.stem.upper(): json.loads(path.read_text()) for path in Path(recorded).glob("*.json")}
+    app.state.requests = 0
+
+    @app.get("/all/{crs}/{rows}")
+    async def board(crs: str, rows: int):
+        app.state.requests += 1
+        delay = max(0.0, rng.gauss(latency_ms, jitter_ms)) if jitter_ms else latency_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and rng.random() < error_rate:
+            raise HTTPException(status_code=503, detail="Fake upstream error")
+        data = recordings.get(crs.upper())
+        if data is None:
+            data = stub.payload(crs.upper())
+            data["trainServices"] = data["trainServices"][:rows]
+        return data
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "recorded_stations": sorted(recordings)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--trains", type=int, default=50, help="services per synthetic board")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="latency standard deviation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--recorded", help="directory of recorded <CRS>.json boards")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.trains, args.latency_ms, args.jitter_ms, args.error_rate, args.recorded, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Scripted load scenarios against a running API, recording throughput and p50/p95/p99 latency.
+
+Run from the repo root (API started against benchmarks.fake_huxley and a benchmarks.dataset database):
+    python -m benchmarks.load run health --concurrency 50 --duration 30
+    python -m benchmarks.load run login --concurrency 20 --duration 15
+    python -m benchmarks.load run reports --concurrency 20 --duration 30 [--replay reports.jsonl]
+    python -m benchmarks.load compare baseline.jsonl candidate.jsonl
+
+Each run appends one JSON line to --out (default benchmarks/results.jsonl), so runs from
+different releases can be compared field by field.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from itertools import cycle
+
+import httpx
+
+from .workload import BENCH_PASSWORD, bench_email, pick_station, synthetic_report
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an ascending list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, statuses, errors, exceptions, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": {
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0,
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "max": ms(ordered[-1]) if ordered else 0,
+        },
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "exceptions": exceptions,
+    }
+
+
+async def wait_until_ready(client, timeout):
+    # The API backfills rollups on startup; don't count that as failed requests
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() > deadline:
+            raise SystemExit(f"API not ready after {timeout}s")
+        await asyncio.sleep(0.5)
+
+
+async def login(client, n):
+    response = await client.post("/users/login", data={"username": bench_email(n), "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+# Scenarios: setup(client, args) -> state; request(client, rng, state) -> response
+
+async def health_setup(client, args):
+    return None
+
+async def health_request(client, rng, state):
+    # Dashboard polling: mostly single hubs, sometimes the whole wallboard
+    if rng.random() < 0.1:
+        return await client.get("/analytics/health", params={"stations": "LDS,MAN,KGX,YRK"})
+    return await client.get(f"/analytics/{pick_station(rng)}/health")
+
+async def login_setup(client, args):
+    return {"users": args.users}
+
+async def login_request(client, rng, state):
+    # Every worker starts at once, so the first seconds are a login burst against the bcrypt pool
+    n = rng.randrange(state["users"])
+    return await client.post("/users/login", data={"username": bench_email(n), "password": BENCH_PASSWORD})
+
+async def reports_setup(client, args):
+    headers = [await login(client, n) for n in range(min(args.users, args.concurrency))]
+    payloads = None
+    if args.replay:
+        with open(args.replay) as f:
+            payloads = cycle([json.loads(line) for line in f if line.strip()])
+    return {"headers": headers, "payloads": payloads}
+
+async def reports_request(client, rng, state):
+    payload = next(state["payloads"]) if state["payloads"] is not None else synthetic_report(rng)
+    return await client.post("/incidents/", json=payload, headers=rng.choice(state["headers"]))
+
+SCENARIOS = {
+    "health": (health_setup, health_request),
+    "login": (login_setup, login_request),
+    "reports": (reports_setup, reports_request),
+}
+
+
+async def run_scenario(args):
+    setup, request = SCENARIOS[args.scenario]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_ready(client, args.wait)
+        state = await setup(client, args)
+        latencies = []
+        statuses = {}
+        exceptions = {}
+        errors = 0
+        deadline = time.perf_counter() + args.duration
+
+        async def worker(seed):
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await request(client, rng, state)
+                except httpx.HTTPError as e:
+                    errors += 1
+                    name = type(e).__name__
+                    exceptions[name] = exceptions.get(name, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(args.seed + i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, statuses, errors, exceptions, elapsed)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    result = asyncio.run(run_scenario(args))
+    record = {
+        "scenario": args.scenario,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "label": args.label,
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        **result,
+    }
+    with open(args.out, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    latency = record["latency_ms"]
+    print(
+        f"{args.scenario}: {record['requests']} requests, {record['errors']} errors, {record['throughput_rps']} req/s, "
+        f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms"
+    )
+
+
+def latest_by_scenario(path):
+    latest = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                latest[record["scenario"]] = record
+    return latest
+
+
+def compare(args):
+    # Latest run per scenario in each file; negative latency deltas / positive throughput deltas are improvements
+    baseline, candidate = latest_by_scenario(args.baseline), latest_by_scenario(args.candidate)
+    print(f"{'scenario':<10} {'metric':<15} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for scenario in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[scenario], candidate[scenario]
+        metrics = [("throughput_rps", old["throughput_rps"], new["throughput_rps"])]
+        metrics += [(f"{p} ms", old["latency_ms"][p], new["latency_ms"][p]) for p in ("p50", "p95", "p99")]
+        for name, before, after in metrics:
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{scenario:<10} {name:<15} {before:>10} {after:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run one scenario")
+    run_parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    run_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds")
+    run_parser.add_argument("--timeout", type=float, default=30, help="per-request timeout, seconds")
+    run_parser.add_argument("--wait", type=float, default=60, help="seconds to wait for the API to come up")
+    run_parser.add_argument("--users", type=int, default=200, help="seeded users available (benchmarks.dataset --users)")
+    run_parser.add_argument("--replay", help="JSONL of IncidentCreate payloads for the reports scenario")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--label", help="free-form tag stored with the result")
+    run_parser.add_argument("--out", default="benchmarks/results.jsonl")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare the latest runs in two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
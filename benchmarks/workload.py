@@ -0,0 +1,25 @@
+"""Workload definitions shared by the dataset generator and the load scenarios."""
+
+BENCH_PASSWORD = "benchmark-password"
+STATIONS = ["LDS", "MAN", "KGX", "YRK", "EDB", "BHM", "LIV", "NCL", "SHF", "BRI"]
+STATION_WEIGHTS = [30, 20, 15, 10, 8, 6, 4, 3, 2, 2]   # a few busy hubs, a long tail
+INCIDENT_TYPES = ["Crowding", "Delay", "Cancellation", "Facilities", "Safety"]
+
+
+def bench_email(n):
+    return f"bench_user_{n}@railpulse.test"
+
+
+def pick_station(rng):
+    return rng.choices(STATIONS, STATION_WEIGHTS)[0]
+
+
+def synthetic_report(rng):
+    # IncidentCreate payload; severity skews low like real reports
+    return {
+        "station_code": pick_station(rng),
+        "train_id": f"T{rng.randrange(10000):04d}" if rng.random() < 0.6 else None,
+        "type": rng.choice(INCIDENT_TYPES),
+        "severity": rng.choices([1, 2, 3, 4, 5], [30, 30, 20, 12, 8])[0],
+        "description": "Synthetic benchmark report",
+    }
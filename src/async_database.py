@@ -0,0 +1,67 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from . import database
+
+# Async twin of database.py for the routes that run on the event loop (incidents, auth).
+# Same database and pool settings; asyncpg for Postgres, aiosqlite for SQLite.
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+async_pool_metrics = database.PoolMetrics()
+
+
+class TimedAsyncQueuePool(database.TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
+
+
+def async_url(url):
+    # postgresql(+psycopg2)://... -> postgresql+asyncpg://..., sqlite://... -> sqlite+aiosqlite://...
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise NotImplementedError(f"No async driver configured for {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+def _async_engine_options(url):
+    options = database.engine_options(url, poolclass=TimedAsyncQueuePool)
+    if url.get_backend_name() == "postgresql":
+        # asyncpg spells these differently from libpq (and rejects sslmode in the URL)
+        connect_args = {"timeout": database.DB_CONNECT_TIMEOUT}
+        sslmode = url.query.get("sslmode")
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        options["connect_args"] = connect_args
+    return options
+
+def make_async_engine(url, **overrides):
+    url = async_url(url)
+    options = _async_engine_options(url)
+    options.update(overrides)
+    return create_async_engine(url.difference_update_query(["sslmode"]), **options)
+
+
+async_engine = make_async_engine(database.SQLALCHEMY_DATABASE_URL)
+
+# expire_on_commit=False: attributes stay loaded after commit (no implicit IO when the response is built)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read-only, autocommit sessions (see database.ReadSessionLocal)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_engine.execution_options(isolation_level="AUTOCOMMIT"),
+    autoflush=False,
+    expire_on_commit=False,
+    info={"read_only": True},
+)
+
+# Give each async API request a fresh database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+def pool_stats():
+    return database.pool_stats(async_engine, async_pool_metrics)
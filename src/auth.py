@@ -4,10 +4,17 @@ from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import database, models
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from . import async_database, metrics, models
 from dotenv import load_dotenv
 import os   
+import asyncio
+import threading
+import time
+import uuid
 
 load_dotenv()
 
@@ -16,7 +23,21 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Verified-token cache
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+# Resolve users straight from the token's claims (sub=user id, email) with no lookup at all.
+# Only safe when deactivation does not need to take effect before the token expires.
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() == "true"
+
+# Password Hashing
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 64))
+# Re-hash on successful login when the stored hash uses an older cost factor
+AUTH_REHASH_ON_LOGIN = os.environ.get("AUTH_REHASH_ON_LOGIN", "false").lower() == "true"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
 def verify_password(plain_password, hashed_password):
@@ -25,6 +46,77 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated pool so login bursts can't take every request thread.
+
+    bcrypt releases the GIL, so threads give real parallelism. Jobs beyond
+    max_queue (running + waiting) are refused with PasswordHasherBusy.
+    """
+
+    def __init__(self, context=pwd_context, workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return asyncio.wrap_future(future)
+
+    def _done(self, _future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def _run(self, fn, *args):
+        # Timed including queueing, which is what a login actually waits for
+        with metrics.stage("password_hash"):
+            return await self._submit(fn, *args)
+
+    async def hash(self, password):
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password, hashed_password):
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password, hashed_password):
+        # (valid, new_hash) - new_hash is set when the stored hash should be upgraded
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": min(self.pending, self.workers),
+                "queue_depth": max(0, self.pending - self.workers),
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+password_hasher = PasswordHasher()
+
+def hasher_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,22 +127,144 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_token(user, expires_delta: Optional[timedelta] = None):
+    # sub carries the user id so a verified token maps to a user without an email lookup
+    return create_access_token(data={"sub": str(user.id), "email": user.email}, expires_delta=expires_delta)
+
+class CurrentUser:
+    """The authenticated identity handed to endpoints (safe to cache, unlike an ORM row)."""
+    __slots__ = ("id", "email", "is_active")
+
+    def __init__(self, id, email, is_active=True):
+        self.id = id
+        self.email = email
+        self.is_active = is_active
+
+class TokenCache:
+    """Bounded LRU of verified token -> CurrentUser, each entry living at most ttl (and never past the token's exp)."""
+
+    def __init__(self, ttl=AUTH_CACHE_TTL, max_entries=AUTH_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # token -> (user, expires_at)
+        self._by_user = {}             # user id -> set of tokens, for invalidation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token, user, token_exp=None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (user, self._clock() + ttl)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._by_user.get(entry[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[entry[0].id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+token_cache = TokenCache()
+
+# Deactivation or a credential change evicts that user's cached tokens.
+# (Mapper events only see ORM flushes; bulk query.update() calls must invalidate explicitly.
+#  Each worker process holds its own cache, so other workers catch up within AUTH_CACHE_TTL.)
+@event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("is_active", "hashed_password", "email")):
+        token_cache.invalidate_user(target.id)
+
+@event.listens_for(models.User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
+def _parse_user_id(sub):
+    try:
+        return uuid.UUID(sub)
+    except (TypeError, ValueError):
+        return None
+
 # DEPENDENCY: Protects endpoints
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(async_database.get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # Already verified and resolved recently
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        sub: str = payload.get("sub")
+        if sub is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+
+    # New tokens carry the user id in sub; older ones carry the email
+    user_id = _parse_user_id(sub)
+    if user_id is not None and AUTH_TRUST_TOKEN_CLAIMS and payload.get("email"):
+        current_user = CurrentUser(user_id, payload["email"])
+    else:
+        # Only the columns CurrentUser needs, no ORM object
+        query = select(models.User.id, models.User.email, models.User.is_active)
+        if user_id is not None:
+            query = query.where(models.User.id == user_id)
+        else:
+            query = query.where(models.User.email == sub)
+        user = (await db.execute(query.limit(1))).first()
+        if user is None or user.is_active is False:
+            raise credentials_exception
+        current_user = CurrentUser(user.id, user.email, user.is_active)
+
+    token_cache.put(token, current_user, payload.get("exp"))
+    return current_user
\ No newline at end of file
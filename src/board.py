@@ -0,0 +1,178 @@
+import marshal
+import sys
+from array import array
+from json.encoder import encode_basestring
+
+# Train status codes (stored one byte per train)
+ON_TIME = 0
+DELAYED = 1
+CANCELLED = 2
+STATUS_LABELS = ("On Time", "Delayed", "Cancelled")
+
+CANCELLED_DELAY = 60   # minutes charged to a cancelled train
+REFUND_THRESHOLD = 15  # minutes late before Delay Repay applies
+
+# One JSON object per train, keys in TrainResponse order (origin_city mirrors from_name)
+_ROW_JSON = (
+    '{"from_code":%s,"from_name":%s,"origin_city":%s,"scheduled":%s,"estimated":%s,'
+    '"status":%s,"delay_weight":%d,"platform":%s,"delay_reason":%s,"operator":%s,'
+    '"length":%d,"refund_eligible":%s,"train_id":%s}'
+)
+_STATUS_JSON = tuple(encode_basestring(label) for label in STATUS_LABELS)
+
+# Bumped whenever the to_bytes() layout changes
+ENCODING_VERSION = 1
+
+
+def _intern(value):
+    # Operators, origins and platforms repeat across every board we hold
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _json_column(values):
+    encoded = {}
+    out = []
+    for value in values:
+        if value is None:
+            out.append("null")
+            continue
+        text = encoded.get(value)
+        if text is None:
+            text = encoded[value] = encode_basestring(value if isinstance(value, str) else str(value))
+        out.append(text)
+    return out
+
+
+class Board:
+    """A parsed departure board stored column-wise (struct of arrays).
+
+    Numeric columns live in typed arrays, so the health metrics are a couple of
+    C-level passes and the JSON body is written straight from the columns.
+    """
+
+    __slots__ = (
+        "station_name", "from_code", "from_name", "scheduled", "estimated", "status",
+        "delay_weight", "platform", "operator", "length", "delay_reason", "train_id",
+        "fetched_at", "stale",
+    )
+
+    def __init__(self, station_name, fetched_at=None):
+        self.station_name = station_name
+        self.fetched_at = fetched_at  # epoch seconds of the upstream response; None if never fetched
+        self.stale = False            # set once a refresh fails and this board is served as the last good one
+        self.from_code = []
+        self.from_name = []
+        self.scheduled = []
+        self.estimated = []
+        self.status = array("b")
+        self.delay_weight = array("H")
+        self.platform = []
+        self.operator = []
+        self.length = array("H")
+        self.delay_reason = []
+        self.train_id = []
+
+    def append(self, from_code, from_name, scheduled, estimated, status, delay_weight,
+               platform=None, operator=None, length=0, delay_reason=None, train_id=None):
+        self.from_code.append(_intern(from_code))
+        self.from_name.append(_intern(from_name))
+        self.scheduled.append(scheduled)
+        self.estimated.append(estimated)
+        self.status.append(status)
+        self.delay_weight.append(delay_weight)
+        self.platform.append(_intern(platform))
+        self.operator.append(_intern(operator))
+        self.length.append(length or 0)
+        self.delay_reason.append(delay_reason)
+        self.train_id.append(train_id)
+
+    def __len__(self):
+        return len(self.status)
+
+    def freshness(self):
+        # "live", "stale" (last good board after failed refreshes) or "unavailable" (no data at all)
+        if self.fetched_at is None:
+            return "unavailable"
+        return "stale" if self.stale else "live"
+
+    def as_stale(self):
+        # Copy flagged stale, sharing the columns (never modified once parsed); the original may be held by other requests
+        board = type(self).__new__(type(self))
+        for name in self.__slots__:
+            setattr(board, name, getattr(self, name))
+        board.stale = True
+        return board
+
+    def metrics(self):
+        # Cancelled trains always carry CANCELLED_DELAY, so the active delay total is a subtraction
+        total = len(self.status)
+        cancelled = self.status.count(CANCELLED)
+        active = total - cancelled
+        active_delay = sum(self.delay_weight) - CANCELLED_DELAY * cancelled
+        return {
+            "trains": total,
+            "cancellations": cancelled,
+            "avg_delay": active_delay / active if active else 0,
+        }
+
+    def row(self, i):
+        delay = self.delay_weight[i]
+        return {
+            "from_code": self.from_code[i],
+            "from_name": self.from_name[i],
+            "origin_city": self.from_name[i],
+            "scheduled": self.scheduled[i],
+            "estimated": self.estimated[i],
+            "status": STATUS_LABELS[self.status[i]],
+            "delay_weight": delay,
+            "platform": self.platform[i],
+            "delay_reason": self.delay_reason[i],
+            "operator": self.operator[i],
+            "length": self.length[i],
+            "refund_eligible": delay >= REFUND_THRESHOLD,
+            "train_id": self.train_id[i],
+        }
+
+    def rows(self):
+        # Per-train dicts, for callers that need them; responses use to_json()
+        return [self.row(i) for i in range(len(self))]
+
+    def to_json(self):
+        from_name = _json_column(self.from_name)
+        rows = zip(
+            _json_column(self.from_code), from_name, from_name,
+            _json_column(self.scheduled), _json_column(self.estimated),
+            [_STATUS_JSON[s] for s in self.status], self.delay_weight,
+            _json_column(self.platform), _json_column(self.delay_reason),
+            _json_column(self.operator), self.length,
+            ["true" if d >= REFUND_THRESHOLD else "false" for d in self.delay_weight],
+            _json_column(self.train_id),
+        )
+        return ("[" + ",".join(_ROW_JSON % row for row in rows) + "]").encode()
+
+    def to_bytes(self):
+        # Compact form for shared caches: typed columns as raw bytes, string columns as lists.
+        # marshal writes each interned operator/origin/platform once and back-references repeats.
+        return marshal.dumps((
+            ENCODING_VERSION, self.station_name, self.fetched_at,
+            self.from_code, self.from_name, self.scheduled, self.estimated,
+            self.status.tobytes(), self.delay_weight.tobytes(),
+            self.platform, self.operator, self.length.tobytes(), self.delay_reason, self.train_id,
+        ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        # Accepts any buffer (e.g. a memoryview into shared memory) without slicing a copy first
+        (version, station_name, fetched_at, from_code, from_name, scheduled, estimated,
+         status, delay_weight, platform, operator, length, delay_reason, train_id) = marshal.loads(data)
+        if version != ENCODING_VERSION:
+            raise ValueError(f"Unsupported board encoding {version}")
+        board = cls(station_name, fetched_at=fetched_at)
+        board.from_code, board.from_name = from_code, from_name
+        board.scheduled, board.estimated = scheduled, estimated
+        board.status.frombytes(status)
+        board.delay_weight.frombytes(delay_weight)
+        board.platform, board.operator = platform, operator
+        board.length.frombytes(length)
+        board.delay_reason, board.train_id = delay_reason, train_id
+        return board
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """Boards held as objects in this process, evicted least recently used first."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (board, stored_at)
+
+    def get(self, key):
+        return self._entries.get(key, (None, None))
+
+    def set(self, key, board, stored_at):
+        # Returns how many entries were evicted to make room
+        self._entries[key] = (board, stored_at)
+        self._entries.move_to_end(key)
+        evicted = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def touch(self, key):
+        self._entries.move_to_end(key)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def mark_stale(self, key):
+        # Swapped for a flagged copy rather than flagged in place: requests may be holding the cached board
+        board, stored_at = self.get(key)
+        if board is not None and not board.stale:
+            self._entries[key] = (board.as_stale(), stored_at)
+
+    def claim_refresh(self, key, now, until):
+        # Only this process reads the entry, so the cache's own refreshing set is enough
+        return True
+
+    def release_refresh(self, key):
+        pass
+
+    def stored_at(self):
+        return {key: stored_at for key, (_, stored_at) in self._entries.items()}
+
+    def stats(self):
+        return {"type": type(self).__name__}
+
+
+class BoardCache:
+    """Per-station board cache: TTL freshness, LRU eviction, stale-while-revalidate.
+
+    A board younger than `ttl` is served as-is. Between `ttl` and `ttl + stale_ttl`
+    the cached board is still served, but a single background refresh is started
+    for that station. Anything older is treated as a miss and loaded inline.
+
+    Boards live in a backend: process memory by default, or one shared by every
+    worker on the host (shared_board_cache.SharedMemoryBackend, with a wall clock).
+    """
+
+    def __init__(self, ttl=30, stale_ttl=300, max_entries=256, clock=time.monotonic, backend=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self.backend = backend or MemoryBackend(max_entries)
+        self._refreshing = set()
+        self._tasks = set()  # keeps async refresh tasks referenced until they finish
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def get(self, key):
+        # Returns (board, age_seconds) or (None, None), without touching the counters
+        with self._lock:
+            board, stored_at = self.backend.get(key)
+            if board is None:
+                return None, None
+            return board, self._clock() - stored_at
+
+    def set(self, key, board):
+        with self._lock:
+            self.evictions += self.backend.set(key, board, self._clock())
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self.backend.clear()
+            else:
+                self.backend.delete(key)
+
+    def mark_stale(self, key):
+        # The board stays cached, flagged as no longer being kept current (see Board.freshness).
+        # Returns the flagged board, or None if nothing is cached for the key.
+        with self._lock:
+            self.backend.mark_stale(key)
+            return self.backend.get(key)[0]
+
+    def _lookup(self, key):
+        # Returns (board, start_refresh); board is None on a miss
+        with self._lock:
+            board, stored_at = self.backend.get(key)
+            if board is not None:
+                now = self._clock()
+                age = now - stored_at
+                if age <= self.ttl:
+                    self.backend.touch(key)
+                    self.hits += 1
+                    return board, False
+                if age <= self.ttl + self.stale_ttl:
+                    self.backend.touch(key)
+                    self.stale_hits += 1
+                    # One refresh per station in this process, and (for a shared backend) across workers
+                    start_refresh = key not in self._refreshing and self.backend.claim_refresh(key, now, now + self.ttl)
+                    if start_refresh:
+                        self._refreshing.add(key)
+                    return board, start_refresh
+            self.misses += 1
+            return None, False
+
+    def get_or_load(self, key, loader, refresh=None):
+        # loader(key) must raise on failure so that errors are never cached; refresh (default loader) runs stale refreshes
+        board, start_refresh = self._lookup(key)
+        if start_refresh:
+            threading.Thread(target=self._refresh, args=(key, refresh or loader), daemon=True).start()
+        if board is not None:
+            return board
+
+        board = loader(key)
+        self.set(key, board)
+        return board
+
+    async def aget_or_load(self, key, loader, refresh=None):
+        # Async twin of get_or_load; loader and refresh are coroutine functions
+        board, start_refresh = self._lookup(key)
+        if start_refresh:
+            task = asyncio.get_running_loop().create_task(self._arefresh(key, refresh or loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if board is not None:
+            return board
+
+        board = await loader(key)
+        self.set(key, board)
+        return board
+
+    def _refresh(self, key, loader):
+        try:
+            self._refresh_done(key, loader(key), None)
+        except Exception as e:
+            self._refresh_done(key, None, e)
+
+    async def _arefresh(self, key, loader):
+        try:
+            self._refresh_done(key, await loader(key), None)
+        except Exception as e:
+            self._refresh_done(key, None, e)
+
+    def _refresh_done(self, key, board, error):
+        if error is None:
+            self.set(key, board)
+        with self._lock:
+            if error is None:
+                self.refreshes += 1
+            else:
+                self.refresh_errors += 1
+                self.backend.release_refresh(key)
+            self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            now = self._clock()
+            ages = {key: round(now - stored_at, 1) for key, stored_at in self.backend.stored_at().items()}
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "backend": self.backend.stats(),
+                "entries": len(ages),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "stale_ttl_seconds": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "evictions": self.evictions,
+                "refreshing": sorted(self._refreshing),
+                "ages": ages,
+            }
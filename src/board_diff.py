@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Board Diff Config
+BOARD_HISTORY_VERSIONS = int(os.environ.get("BOARD_HISTORY_VERSIONS", 20))   # previous boards kept per station
+BOARD_HISTORY_STATIONS = int(os.environ.get("BOARD_HISTORY_STATIONS", 1000))
+
+
+def train_key(row):
+    # Huxley's serviceId; the (rare) trains without one are keyed by schedule and origin
+    return row["train_id"] or f'{row["scheduled"]}/{row["from_code"]}'
+
+def _keyed_rows(board):
+    return {train_key(row): row for row in board.rows()}
+
+def diff_boards(old, new):
+    # Keyed by train: whole rows for added trains, keys for removed ones, only the changed fields otherwise
+    before = _keyed_rows(old)
+    after = _keyed_rows(new)
+    added = []
+    changed = []
+    for key, row in after.items():
+        previous = before.get(key)
+        if previous is None:
+            added.append(dict(row, key=key))
+        elif previous != row:
+            delta = {field: value for field, value in row.items() if previous[field] != value}
+            delta["key"] = key
+            changed.append(delta)
+    removed = [key for key in before if key not in after]
+    return {"added": added, "removed": removed, "changed": changed}
+
+def is_empty(diff):
+    return not (diff["added"] or diff["removed"] or diff["changed"])
+
+def board_version(board):
+    # Derived from the board itself (columns, fetch time, stale flag), not a per-process counter: workers
+    # sharing a board agree on its version, and one from a board this process never held matches nothing
+    # (to_json, not to_bytes: marshal's output depends on object identity, the JSON only on the values)
+    digest = hashlib.blake2b(board.to_json(), digest_size=8)
+    digest.update(repr((board.station_name, board.fetched_at, board.stale)).encode())
+    return (int.from_bytes(digest.digest(), "big") >> 11) or 1  # 53 bits, exact as a JSON number; 0 = no board
+
+
+class BoardHistory:
+    """Recent boards per station, keyed by version, so callers can ask for the changes since one.
+
+    Versions are content-derived (board_version), so they are not ordered; an
+    unknown, expired or foreign `since` always gets the full board back.
+    """
+
+    def __init__(self, versions=BOARD_HISTORY_VERSIONS, max_stations=BOARD_HISTORY_STATIONS):
+        self.versions = versions
+        self.max_stations = max_stations
+        self._stations = OrderedDict()  # code -> {"version", "boards": deque[(version, board)], "diffs": {since: diff}}
+        self._lock = threading.Lock()
+
+    def record(self, code, board):
+        # Recording the board already current (or an identical one) is a no-op
+        with self._lock:
+            station = self._stations.get(code)
+            if station is not None and station["boards"][-1][1] is board:
+                return station["version"]
+        version = board_version(board)  # hashed outside the lock
+        with self._lock:
+            station = self._stations.get(code)
+            if station is None:
+                station = self._stations[code] = {"version": 0, "boards": deque(maxlen=self.versions), "diffs": {}}
+                if len(self._stations) > self.max_stations:
+                    self._stations.popitem(last=False)
+            else:
+                self._stations.move_to_end(code)
+            if station["version"] != version:
+                station["version"] = version
+                station["boards"].append((version, board))
+                station["diffs"] = {}
+            return version
+
+    def clear(self):
+        with self._lock:
+            self._stations.clear()
+
+    def version(self, code):
+        with self._lock:
+            station = self._stations.get(code)
+            return station["version"] if station else 0
+
+    def changes(self, code, since):
+        # (version, board, diff); diff is None when `since` is unknown or too old and the client needs the full board
+        with self._lock:
+            station = self._stations.get(code)
+            if station is None:
+                return 0, None, None
+            version, board = station["boards"][-1]
+            old = None
+            if since is not None:
+                old = next((b for v, b in station["boards"] if v == since), None)
+            diffs = station["diffs"]
+        if old is None:
+            return version, board, None
+
+        # Diffed outside the lock; clients polling with the same `since` share one result
+        diff = diffs.get(since)
+        if diff is None:
+            diff = diffs[since] = diff_boards(old, board)
+        return version, board, diff
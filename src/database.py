@@ -1,22 +1,139 @@
 import os
+import threading
+import time
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool, per worker process (size + overflow across all workers must stay under the server's connection cap)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))          # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))          # seconds; under Azure's idle disconnect
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", 5))       # seconds (Postgres)
+DB_SLOW_CHECKOUT_MS = float(os.environ.get("DB_SLOW_CHECKOUT_MS", 50))
+
+
+class PoolMetrics:
+    """Checkout counts and wait times for the engine's pool (shared by recreated pools)."""
+
+    def __init__(self, slow_ms=DB_SLOW_CHECKOUT_MS):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.slow_checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if seconds * 1000 >= self.slow_ms:
+                self.slow_checkouts += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "slow_checkouts": self.slow_checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedCheckoutMixin:
+    """Records how long each checkout waited for a connection into the pool class's `metrics`."""
+
+    metrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(TimedCheckoutMixin, QueuePool):
+    metrics = pool_metrics
+
+
+def engine_options(url, poolclass=TimedQueuePool):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its one connection per thread
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    options = {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"connect_timeout": DB_CONNECT_TIMEOUT}
+    return options
+
 # Create the Connection Engine
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, pool_pre_ping=True
-)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 
 # Session Factory creates new DB connections for each request
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only sessions run in autocommit mode: no BEGIN/COMMIT round trips around their queries.
+# Used by background readers (live feed); routes read through async_database.get_async_read_db.
+ReadSessionLocal = sessionmaker(
+    autoflush=False,
+    bind=engine.execution_options(isolation_level="AUTOCOMMIT"),
+    info={"read_only": True},
+)
+
+@event.listens_for(Session, "before_flush")
+def _reject_read_only_writes(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise RuntimeError("Attempted to write through a read-only session")
+
+# Statement time feeds the "db" request stage (every engine, sync and async)
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("statement_started")
+    if started:
+        metrics.record_stage("db", time.perf_counter() - started.pop())
+
 # Base class
 Base = declarative_base()
 
@@ -27,4 +144,26 @@ def get_db():
         yield db
     finally:
         db.close()
-        
\ No newline at end of file
+
+def pool_stats(engine=engine, metrics=pool_metrics):
+    pool = engine.pool
+    stats = {"pool": pool.__class__.__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+        })
+    stats.update(metrics.stats())
+    return stats
+
+# INSERT that supports ON CONFLICT for the session's backend (Postgres in production, SQLite in tests)
+def upsert_insert(db, table):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
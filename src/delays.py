@@ -0,0 +1,65 @@
+from array import array
+from .board import ON_TIME, DELAYED, CANCELLED, CANCELLED_DELAY
+
+# Every valid "HH:MM" string -> minutes since midnight (1440 entries, built once)
+MINUTES = {f"{h:02d}:{m:02d}": h * 60 + m for h in range(24) for m in range(60)}
+
+# Huxley's non-time estimate values
+ESTIMATE_STATES = {
+    "On time": (ON_TIME, 0),
+    "Cancelled": (CANCELLED, CANCELLED_DELAY),
+    "Delayed": (DELAYED, 0),  # late, but no estimate published yet
+}
+
+def parse_hhmm(text):
+    # Minutes since midnight, or None for anything that isn't a clock time
+    return MINUTES.get(text)
+
+def minutes_late(scheduled, estimated):
+    # Both in minutes since midnight; an estimate 12h+ "earlier" has crossed midnight
+    diff = estimated - scheduled
+    if diff < -720:
+        diff += 1440
+    return diff if diff > 0 else 0
+
+def classify(scheduled, estimated):
+    # (status, delay_minutes) for one train from Huxley's sta/eta (or std/etd) strings
+    state = ESTIMATE_STATES.get(estimated)
+    if state is not None:
+        return state
+    eta = MINUTES.get(estimated)
+    sta = MINUTES.get(scheduled)
+    if eta is None or sta is None:
+        return ON_TIME, 0
+    delay = minutes_late(sta, eta)
+    return (DELAYED if delay else ON_TIME), delay
+
+def classify_many(scheduled, estimated):
+    # Whole-board version: two parallel lists in, (status array, delay array) out.
+    # Same rules as classify(), inlined to skip a call per train.
+    statuses = []
+    delays = []
+    states = ESTIMATE_STATES
+    minutes = MINUTES
+    for sta, eta in zip(scheduled, estimated):
+        state = states.get(eta)
+        if state is not None:
+            statuses.append(state[0])
+            delays.append(state[1])
+            continue
+        eta_min = minutes.get(eta)
+        sta_min = minutes.get(sta)
+        if eta_min is None or sta_min is None:
+            statuses.append(ON_TIME)
+            delays.append(0)
+            continue
+        diff = eta_min - sta_min
+        if diff < -720:
+            diff += 1440
+        if diff > 0:
+            statuses.append(DELAYED)
+            delays.append(diff)
+        else:
+            statuses.append(ON_TIME)
+            delays.append(0)
+    return array("b", statuses), array("H", delays)
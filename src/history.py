@@ -0,0 +1,209 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+from . import database, hub_health, ingestion, models, rate_limit
+
+# History Config
+HISTORY_ENABLED = os.environ.get("HISTORY_ENABLED", "false").lower() == "true"
+HISTORY_STATIONS = [c.strip().upper() for c in os.environ.get("HISTORY_STATIONS", ",".join(ingestion.INGEST_STATIONS)).split(",") if c.strip()]
+HISTORY_INTERVAL = float(os.environ.get("HISTORY_INTERVAL", 60))                   # seconds between snapshots
+HISTORY_RAW_RETENTION_DAYS = float(os.environ.get("HISTORY_RAW_RETENTION_DAYS", 7))
+HISTORY_HOURLY_RETENTION_DAYS = float(os.environ.get("HISTORY_HOURLY_RETENTION_DAYS", 365))
+HISTORY_MAX_POINTS = 5000
+
+HOUR = 3600
+raw_table = models.StressSnapshot.__table__
+hourly_table = models.StressSnapshotHourly.__table__
+
+def record_snapshots(db: Session, healths, ts=None):
+    # One append per station per tick; a repeat for the same second is ignored
+    ts = int(ts if ts is not None else time.time())
+    # Stations with no board data would record a meaningless zero
+    rows = [
+        {
+            "station_code": h["station_code"],
+            "ts": ts,
+            "stress_index": h["stress_index"],
+            "hub_status": h["hub_status"],
+            "cancellations": h["metrics"]["cancellations"],
+            "avg_delay": h["metrics"]["avg_delay"],
+            "passenger_reports": h["metrics"]["passenger_reports"],
+            "avg_report_severity": h["metrics"]["avg_report_severity"],
+        }
+        for h in healths
+        if h.get("feed", {}).get("status") != "unavailable"
+    ]
+    if rows:
+        db.execute(database.upsert_insert(db, raw_table).values(rows).on_conflict_do_nothing(index_elements=["station_code", "ts"]))
+    db.commit()
+
+def _raw_buckets(db: Session, step, conditions):
+    bucket = (raw_table.c.ts - raw_table.c.ts % step).label("bucket")
+    return db.query(
+        raw_table.c.station_code,
+        bucket,
+        func.count(),
+        func.sum(raw_table.c.stress_index),
+        func.max(raw_table.c.stress_index),
+        func.sum(raw_table.c.avg_delay),
+        func.max(raw_table.c.cancellations),
+        func.max(raw_table.c.passenger_reports),
+    ).filter(*conditions).group_by(raw_table.c.station_code, bucket).all()
+
+def _hourly_buckets(db: Session, step, conditions):
+    bucket = (hourly_table.c.ts - hourly_table.c.ts % step).label("bucket")
+    return db.query(
+        hourly_table.c.station_code,
+        bucket,
+        func.sum(hourly_table.c.samples),
+        func.sum(hourly_table.c.stress_sum),
+        func.max(hourly_table.c.stress_max),
+        func.sum(hourly_table.c.avg_delay_sum),
+        func.max(hourly_table.c.cancellations_max),
+        func.max(hourly_table.c.passenger_reports_max),
+    ).filter(*conditions).group_by(hourly_table.c.station_code, bucket).all()
+
+def compact(db: Session, now=None):
+    # Downsample every finished hour into the hourly table, then apply retention to both tables
+    now = int(now if now is not None else time.time())
+    current_hour = now - now % HOUR
+    last_done = db.query(func.max(hourly_table.c.ts)).scalar()
+    start = last_done + HOUR if last_done is not None else 0
+
+    rows = _raw_buckets(db, HOUR, [raw_table.c.ts >= start, raw_table.c.ts < current_hour])
+    if rows:
+        values = [
+            {
+                "station_code": code, "ts": bucket, "samples": samples,
+                "stress_sum": stress_sum, "stress_max": stress_max, "avg_delay_sum": delay_sum,
+                "cancellations_max": cancellations_max, "passenger_reports_max": reports_max,
+            }
+            for code, bucket, samples, stress_sum, stress_max, delay_sum, cancellations_max, reports_max in rows
+        ]
+        stmt = database.upsert_insert(db, hourly_table).values(values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["station_code", "ts"],
+            set_={name: stmt.excluded[name] for name in values[0] if name not in ("station_code", "ts")},
+        ))
+
+    raw_cutoff = now - int(HISTORY_RAW_RETENTION_DAYS * 86400)
+    hourly_cutoff = now - int(HISTORY_HOURLY_RETENTION_DAYS * 86400)
+    db.execute(delete(raw_table).where(raw_table.c.ts < min(raw_cutoff, current_hour)))
+    db.execute(delete(hourly_table).where(hourly_table.c.ts < hourly_cutoff))
+    db.commit()
+
+def query_history(db: Session, station_code, start, end, step):
+    # Points of (up to) `step` seconds between start and end (epoch seconds).
+    # Steps of an hour or more read the hourly table for compacted hours and raw samples for the rest.
+    raw_conditions = [raw_table.c.station_code == station_code, raw_table.c.ts >= start, raw_table.c.ts < end]
+    rows = []
+    if step >= HOUR and step % HOUR == 0:
+        compacted_until = db.query(func.max(hourly_table.c.ts)).filter(hourly_table.c.station_code == station_code).scalar()
+        if compacted_until is not None:
+            compacted_until += HOUR
+            rows += _hourly_buckets(db, step, [
+                hourly_table.c.station_code == station_code,
+                hourly_table.c.ts >= start - start % HOUR,
+                hourly_table.c.ts < min(end, compacted_until),
+            ])
+            raw_conditions.append(raw_table.c.ts >= compacted_until)
+    rows += _raw_buckets(db, step, raw_conditions)
+
+    # Merge (a step can straddle the hourly/raw boundary)
+    points = {}
+    for _, bucket, samples, stress_sum, stress_max, delay_sum, cancellations_max, reports_max in rows:
+        point = points.get(bucket)
+        if point is None:
+            points[bucket] = [samples, stress_sum, stress_max, delay_sum, cancellations_max, reports_max]
+        else:
+            point[0] += samples
+            point[1] += stress_sum
+            point[2] = max(point[2], stress_max)
+            point[3] += delay_sum
+            point[4] = max(point[4], cancellations_max)
+            point[5] = max(point[5], reports_max)
+
+    return [
+        {
+            "timestamp": datetime.fromtimestamp(bucket, tz=timezone.utc),
+            "samples": samples,
+            "stress_index_avg": round(stress_sum / samples, 3),
+            "stress_index_max": stress_max,
+            "avg_delay": round(delay_sum / samples, 1),
+            "max_cancellations": cancellations_max,
+            "max_passenger_reports": reports_max,
+        }
+        for bucket, (samples, stress_sum, stress_max, delay_sum, cancellations_max, reports_max) in sorted(points.items())
+    ]
+
+
+class HistoryRecorder:
+    """Snapshots every watched station's health on a fixed interval and compacts once an hour."""
+
+    def __init__(self, stations, interval=HISTORY_INTERVAL):
+        self.stations = list(stations)
+        self.interval = interval
+        self._task = None
+        self._last_compact = 0
+        self.snapshots = 0
+        self.errors = 0
+
+    async def snapshot_once(self):
+        # Any upstream fetches here are background work: user-facing requests go first
+        with rate_limit.background():
+            boards = await asyncio.gather(*(ingestion.get_board(code) for code in self.stations))
+
+        def write():
+            db = database.SessionLocal()
+            try:
+                report_stats = hub_health.recent_report_stats(db, self.stations)
+                healths = [
+                    hub_health.compute_hub_health(code, board, report_stats[code])
+                    for code, board in zip(self.stations, boards)
+                ]
+                record_snapshots(db, healths)
+                if time.time() - self._last_compact >= HOUR:
+                    compact(db)
+                    self._last_compact = time.time()
+            finally:
+                db.close()
+        await run_in_threadpool(write)
+        self.snapshots += 1
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.snapshot_once()
+            except Exception:
+                self.errors += 1
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "stations": self.stations,
+            "interval_seconds": self.interval,
+            "snapshots": self.snapshots,
+            "errors": self.errors,
+        }
+
+
+recorder = HistoryRecorder(HISTORY_STATIONS)
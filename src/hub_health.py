@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import rollups
+
+REPORT_WINDOW = timedelta(hours=1)
+
+def _empty_stats():
+    return {"count": 0, "avg_severity": 0, "max_severity": 0, "by_type": {}}
+
+def recent_report_stats(db: Session, station_codes, since=None):
+    # Read from the per-minute rollups over a sliding window, so cost is O(buckets), not O(reports).
+    # Returns {code: {"count", "avg_severity", "max_severity", "by_type": {type: {...}}}}
+    if since is None:
+        since = datetime.now() - REPORT_WINDOW
+    stats = {code: _empty_stats() for code in station_codes}
+    rows = rollups.window_rows(db, station_codes, since)
+
+    # Roll the per-type rows up to station level (O(types), not O(reports))
+    severity_sums = {}
+    for code, incident_type, count, severity_sum, max_severity in rows:
+        station = stats[code]
+        severity_sum = severity_sum or 0
+        max_severity = max_severity or 0
+        station["by_type"][incident_type] = {
+            "count": count,
+            "avg_severity": round(severity_sum / count, 1) if count else 0,
+            "max_severity": max_severity,
+        }
+        station["count"] += count
+        station["max_severity"] = max(station["max_severity"], max_severity)
+        severity_sums[code] = severity_sums.get(code, 0) + severity_sum
+
+    for code, severity_sum in severity_sums.items():
+        if stats[code]["count"]:
+            stats[code]["avg_severity"] = severity_sum / stats[code]["count"]
+    return stats
+
+async def recent_report_stats_async(db: AsyncSession, station_codes, since=None):
+    # Same aggregate on an AsyncSession (the rollup query runs on its sync facade)
+    return await db.run_sync(recent_report_stats, station_codes, since)
+
+def compute_hub_health(station_code, board, report_stats):
+    full_station_name = board.station_name or "Unknown Station"
+
+    # Calculate Rail Metrics (single pass over the board's columns)
+    rail_metrics = board.metrics()
+    total_trains = rail_metrics["trains"]
+    cancelled_trains = rail_metrics["cancellations"]
+    avg_delay = rail_metrics["avg_delay"]
+
+    # Crowd Metrics
+    report_count = report_stats["count"]
+    avg_severity = report_stats["avg_severity"] if report_count else 0
+
+    # Score Algorithm (0.0 - 1.0)
+    score = (avg_severity / 5.0 * 0.4) + (min(avg_delay, 60) / 60.0 * 0.6)
+
+    # Determine Status Band
+    status = "GREEN"
+    if score > 0.7: status = "RED"
+    elif score > 0.35: status = "AMBER"
+
+    # Domain Override
+    if cancelled_trains > (total_trains * 0.25):
+        status = "Amber"
+        score = max(score, 0.35)
+    elif cancelled_trains > (total_trains * 0.5):
+        status = "Red"
+        score = max(score, 0.7)
+
+    # No board at all: an empty departure list says nothing about delays, so don't call it GREEN
+    freshness = board.freshness()
+    if freshness == "unavailable":
+        status = "UNKNOWN"
+
+    return {
+        "station": full_station_name,
+        "station_code": station_code,
+        "timestamp": datetime.now(),
+        "hub_status": status,
+        "stress_index": round(score, 2),
+        "feed": {
+            "status": freshness,
+            "fetched_at": datetime.fromtimestamp(board.fetched_at, timezone.utc) if board.fetched_at else None,
+        },
+        "metrics": {
+            "cancellations": cancelled_trains,
+            "avg_delay": round(avg_delay, 1),
+            "passenger_reports": report_count,
+            "avg_report_severity": round(avg_severity, 1),
+            "max_report_severity": report_stats.get("max_severity", 0),
+            "reports_by_type": report_stats.get("by_type", {})
+        }
+    }
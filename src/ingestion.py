@@ -0,0 +1,194 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from . import rail_service
+from .board_diff import BoardHistory
+
+# Ingestion Config
+INGEST_ENABLED = os.environ.get("INGEST_ENABLED", "false").lower() == "true"
+INGEST_STUB = os.environ.get("INGEST_STUB", "false").lower() == "true"
+INGEST_STATIONS = [c.strip().upper() for c in os.environ.get("INGEST_STATIONS", "LDS,MAN,KGX,YRK").split(",") if c.strip()]
+INGEST_INTERVAL = float(os.environ.get("INGEST_INTERVAL", 30))           # seconds between sweeps of the watchlist
+INGEST_MAX_RPS = float(os.environ.get("INGEST_MAX_RPS", 2))              # upstream calls per second, across the sweep
+INGEST_MAX_BOARD_AGE = float(os.environ.get("INGEST_MAX_BOARD_AGE", INGEST_INTERVAL * 3))
+
+
+class BoardStore:
+    """Latest parsed board per CRS code, written by the poller and read by the routes."""
+
+    def __init__(self, clock=time.time, history=None):
+        self._clock = clock
+        self._boards = {}  # code -> {"board", "fetched_at", "version"}
+        self._lock = threading.Lock()
+        # Versions come from the board history, which also serves diffs between them
+        self.history = history or BoardHistory()
+
+    def put(self, code, board):
+        with self._lock:
+            version = self.history.record(code, board)
+            self._boards[code] = {"board": board, "fetched_at": self._clock(), "version": version}
+            return version
+
+    def get(self, code, max_age=None):
+        # Returns the board, or None if missing or older than max_age seconds
+        with self._lock:
+            entry = self._boards.get(code)
+        if entry is None:
+            return None
+        if max_age is not None and self._clock() - entry["fetched_at"] > max_age:
+            return None
+        return entry["board"]
+
+    def mark_stale(self, code):
+        # Swaps in a stale-flagged copy, as a new version so cached bodies pick up the flag.
+        # Returns the stored board (None if there is none); readers holding the old object are unaffected.
+        with self._lock:
+            entry = self._boards.get(code)
+            if entry is None:
+                return None
+            if not entry["board"].stale:
+                board = entry["board"].as_stale()
+                entry = self._boards[code] = dict(entry, board=board, version=self.history.record(code, board))
+            return entry["board"]
+
+    def entry(self, code):
+        with self._lock:
+            return self._boards.get(code)
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+        self.history.clear()
+
+    def stats(self):
+        with self._lock:
+            now = self._clock()
+            return {
+                code: {"age_seconds": round(now - e["fetched_at"], 1), "version": e["version"], "trains": len(e["board"])}
+                for code, e in self._boards.items()
+            }
+
+
+class StubUpstream:
+    """Offline stand-in for Huxley: synthetic boards that change a little every call."""
+
+    STATUSES = ["On time", "On time", "On time", "Delayed", "Cancelled"]
+
+    def __init__(self, trains_per_board=30, seed=0):
+        self.trains_per_board = trains_per_board
+        self.seed = seed
+        self.calls = 0
+
+    def payload(self, code):
+        self.calls += 1
+        rng = random.Random(f"{self.seed}:{code}:{self.calls}")
+        services = []
+        for i in range(self.trains_per_board):
+            sched = (6 * 60 + i * 7) % 1440
+            sta = f"{sched // 60:02d}:{sched % 60:02d}"
+            eta = rng.choice(self.STATUSES)
+            if eta == "Delayed":
+                late = (sched + rng.randint(1, 40)) % 1440
+                eta = f"{late // 60:02d}:{late % 60:02d}"
+            services.append({
+                "origin": [{"crs": "STB", "locationName": "Stubton"}],
+                "sta": sta,
+                "eta": eta,
+                "platform": str(rng.randint(1, 12)),
+                "operator": "Stub Rail",
+                "serviceId": f"{code}{i:04d}",
+            })
+        return {"locationName": f"{code} (stub)", "trainServices": services}
+
+    async def fetch(self, code):
+        return rail_service.parse_board(self.payload(code), code)
+
+
+class BoardPoller:
+    """Sweeps a watchlist of stations on a fixed interval, spacing upstream calls to stay under max_rps."""
+
+    def __init__(self, store, stations, fetcher, interval=INGEST_INTERVAL, max_rps=INGEST_MAX_RPS):
+        self.store = store
+        self.stations = list(stations)
+        self.fetcher = fetcher
+        self.interval = interval
+        self.min_spacing = 1.0 / max_rps if max_rps > 0 else 0
+        self._task = None
+        self.sweeps = 0
+        self.fetches = 0
+        self.errors = 0
+        self.last_error = None
+
+    async def poll_once(self):
+        for i, code in enumerate(self.stations):
+            if i and self.min_spacing:
+                await asyncio.sleep(self.min_spacing)
+            try:
+                board = await self.fetcher(code)
+            except Exception as e:
+                # Keep serving the previous board, marked stale; the route falls back once it ages out
+                self.errors += 1
+                self.last_error = f"{code}: {e!r}"
+                self.store.mark_stale(code)
+                continue
+            self.store.put(code, board)
+            self.fetches += 1
+        self.sweeps += 1
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            await self.poll_once()
+            await asyncio.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "stations": self.stations,
+            "interval_seconds": self.interval,
+            "sweeps": self.sweeps,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "boards": self.store.stats(),
+        }
+
+
+board_store = BoardStore()
+poller = BoardPoller(
+    board_store,
+    INGEST_STATIONS,
+    StubUpstream().fetch if INGEST_STUB else rail_service.prefetch_board_async,
+)
+
+async def get_board(code):
+    # Routes read the poller's store; stations outside the watchlist (or with an aged-out board) use the cached fetch
+    board = board_store.get(code.upper(), max_age=INGEST_MAX_BOARD_AGE)
+    if board is not None:
+        return board
+    board = await rail_service.get_live_arrivals_async(hub_code=code)
+    if board.freshness() == "unavailable":
+        # Upstream down and nothing cached: an aged-out polled board still beats no data
+        aged = board_store.mark_stale(code.upper())
+        if aged is not None:
+            return aged
+        # A fresh placeholder per call: recording it would bump the version (and churn ETags) on every request
+        return board
+    # Number fetched boards too, so any station can be diffed (the cached board repeats without a new version)
+    board_store.history.record(code.upper(), board)
+    return board
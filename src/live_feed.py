@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+from fastapi.concurrency import run_in_threadpool
+from . import board_diff, database, hub_health, ingestion, serialization
+
+# Live Feed Config
+FEED_INTERVAL = float(os.environ.get("FEED_INTERVAL", 15))      # seconds between recomputes of subscribed stations
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", 16))    # pending events per client before the oldest is dropped
+FEED_HEARTBEAT = float(os.environ.get("FEED_HEARTBEAT", 15))    # idle seconds before a keep-alive comment
+
+HEARTBEAT = b": keep-alive\n\n"
+
+def sse_message(event, data):
+    # data is a single line of JSON bytes
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":"), default=lambda o: o.isoformat()).encode()
+
+
+class Subscription:
+    """One connected client: the stations it follows and its bounded outbox."""
+
+    __slots__ = ("stations", "queue", "dropped")
+
+    def __init__(self, stations, queue_size=FEED_QUEUE_SIZE):
+        self.stations = stations
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, message):
+        # A slow client loses its oldest pending event instead of holding up the fan-out
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class LiveFeed:
+    """Recomputes health/departures once per subscribed station and fans the encoded events out to every client."""
+
+    def __init__(self, interval=FEED_INTERVAL, session_factory=None):
+        self.interval = interval
+        self._session_factory = session_factory
+        self._topics = {}   # code -> set of Subscriptions
+        self._last = {}     # code -> {event: (change key, encoded message)}
+        self._wake = None
+        self._task = None
+        self.refreshes = 0
+        self.published = 0
+        self.errors = 0
+
+    def subscribe(self, stations):
+        subscription = Subscription(stations)
+        new_station = False
+        for code in stations:
+            if code not in self._topics:
+                self._topics[code] = set()
+                new_station = True
+            self._topics[code].add(subscription)
+        self._ensure_running()
+        if new_station:
+            # Don't make the first subscriber of a station wait out the interval
+            self._wake.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for code in subscription.stations:
+            subscribers = self._topics.get(code)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[code]
+                self._last.pop(code, None)
+
+    def current(self, stations):
+        # Latest event of each kind for the given stations (sent to a client as it connects)
+        return [message for code in stations for _, message in self._last.get(code, {}).values()]
+
+    def _report_stats(self, codes):
+        db = (self._session_factory or database.ReadSessionLocal)()
+        try:
+            return hub_health.recent_report_stats(db, codes)
+        finally:
+            db.close()
+
+    async def refresh_once(self):
+        codes = list(self._topics)
+        if not codes:
+            return
+        boards, report_stats = await asyncio.gather(
+            asyncio.gather(*(ingestion.get_board(code) for code in codes)),
+            run_in_threadpool(self._report_stats, codes),
+        )
+        for code, board in zip(codes, boards):
+            health = hub_health.compute_hub_health(code, board, report_stats[code])
+            timestamp = health.pop("timestamp")
+            health_key = _encode(health)
+            health["timestamp"] = timestamp
+            self._publish(code, "health", health_key, lambda: _encode(health))
+
+            self._publish_departures(code, board)
+        self.refreshes += 1
+
+    def _publish(self, code, event, key, encode):
+        # Encode once per change; every subscriber gets the same bytes
+        last = self._last.setdefault(code, {})
+        previous = last.get(event)
+        if previous is not None and previous[0] == key:
+            return
+        message = sse_message(event, encode())
+        last[event] = (key, message)
+        self._fan_out(code, message)
+
+    def _publish_departures(self, code, board):
+        # Connecting clients get the whole board; connected ones get a `changes` diff from the version they hold
+        version = ingestion.board_store.history.version(code)
+        last = self._last.setdefault(code, {})
+        previous = last.get("departures")
+        if previous is not None and previous[0] == version:
+            return
+        snapshot = sse_message(
+            "departures",
+            b'{"station_code":' + _encode(code) + b',"version":' + str(version).encode() + b',"trains":' + serialization.board_json(board) + b"}",
+        )
+        last["departures"] = (version, snapshot)
+        if previous is None:
+            self._fan_out(code, snapshot)
+            return
+        _, _, diff = ingestion.board_store.history.changes(code, previous[0])
+        if diff is None:
+            self._fan_out(code, snapshot)
+        elif not board_diff.is_empty(diff):
+            self._fan_out(code, sse_message("changes", _encode({"station_code": code, "version": version, "since": previous[0], **diff})))
+
+    def _fan_out(self, code, message):
+        for subscription in self._topics.get(code, ()):
+            subscription.push(message)
+            self.published += 1
+
+    async def events(self, stations):
+        # Async generator for a streaming response; subscribed while the client is connected
+        subscription = self.subscribe(stations)
+        try:
+            for message in self.current(subscription.stations):
+                yield message
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            self.unsubscribe(subscription)
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            self._wake.clear()
+            try:
+                await self.refresh_once()
+            except Exception:
+                self.errors += 1
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0, self.interval - (time.monotonic() - started)))
+            except asyncio.TimeoutError:
+                pass
+
+    def _ensure_running(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        subscribers = set().union(*self._topics.values()) if self._topics else set()
+        return {
+            "running": self._task is not None,
+            "interval_seconds": self.interval,
+            "subscribers": len(subscribers),
+            "stations": {code: len(subs) for code, subs in self._topics.items()},
+            "refreshes": self.refreshes,
+            "published": self.published,
+            "dropped": sum(s.dropped for s in subscribers),
+            "errors": self.errors,
+        }
+
+
+feed = LiveFeed()
@@ -1,14 +1,52 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from src.routers import auth
 import src.models as models
 import src.database as database
+import src.async_database as async_database
+import src.rail_service as rail_service
+import src.ingestion as ingestion
+import src.auth as auth_service
+import src.rollups as rollups
+import src.hub_health as hub_health
+import src.history as history
+import src.live_feed as live_feed
+import src.response_cache as response_cache
+import src.metrics as metrics
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
 from src.routers import incidents, analytics
 
 # Create Tables
 models.Base.metadata.create_all(bind=database.engine)
 
-app = FastAPI(title="RailPulse API", version="2.0.0")
+def _backfill_rollups():
+    db = database.SessionLocal()
+    try:
+        rollups.backfill(db, datetime.now() - hub_health.REPORT_WINDOW)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Make sure the health window's rollups exist (e.g. first start after the rollup table was added)
+    if rollups.ROLLUP_BACKFILL_ON_STARTUP:
+        await run_in_threadpool(_backfill_rollups)
+    await rail_service.aopen()
+    if ingestion.INGEST_ENABLED:
+        ingestion.poller.start()
+    if history.HISTORY_ENABLED:
+        history.recorder.start()
+    yield
+    await live_feed.feed.stop()
+    await history.recorder.stop()
+    await ingestion.poller.stop()
+    # Release pooled upstream connections
+    await rail_service.aclose()
+    await async_database.async_engine.dispose()
+
+app = FastAPI(title="RailPulse API", version="2.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -19,6 +57,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route + stage breakdown (outermost, so it times the whole stack)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Gauges read on each /metrics scrape
+metrics.register_gauges("board_cache", rail_service.board_cache.stats)
+metrics.register_gauges("upstream_circuit", rail_service.breaker.stats)
+metrics.register_gauges("upstream_station_circuits", rail_service.station_breakers.stats)
+if rail_service.rate_limiter is not None:
+    metrics.register_gauges("upstream_rate_limit", lambda: {
+        f"{counter}_{lane}": count
+        for counter in ("granted", "throttled", "rejected")
+        for lane, count in getattr(rail_service.rate_limiter, counter).items()
+    })
+metrics.register_gauges("response_cache", response_cache.cache.stats)
+metrics.register_gauges("token_cache", auth_service.token_cache.stats)
+metrics.register_gauges("password_hashing", auth_service.password_hasher.stats)
+metrics.register_gauges("db_pool", database.pool_stats)
+metrics.register_gauges("async_db_pool", async_database.pool_stats)
+
 # Include Routers
 app.include_router(auth.router)
 app.include_router(incidents.router)
@@ -26,4 +83,29 @@ app.include_router(analytics.router)
 
 @app.get("/")
 def root():
-    return {"message": "RailPulse API is Online"}
\ No newline at end of file
+    return {"message": "RailPulse API is Online"}
+
+@app.get("/status")
+def runtime_status():
+    # Worker-local runtime stats for capacity tuning
+    return {
+        "board_cache": rail_service.cache_stats(),
+        "ingestion": ingestion.poller.stats(),
+        "history": history.recorder.stats(),
+        "live_feed": live_feed.feed.stats(),
+        "response_cache": response_cache.cache.stats(),
+        "db_pool": database.pool_stats(),
+        "async_db_pool": async_database.pool_stats(),
+        "token_cache": auth_service.token_cache.stats(),
+        "password_hashing": auth_service.password_hasher.stats(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Prometheus text format; worker-local like /status, so scrape each worker
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/metrics/slow", include_in_schema=False)
+def slow_request_samples():
+    # Most recent requests over METRICS_SLOW_REQUEST_MS, with their stage breakdown
+    return {"threshold_ms": metrics.slow_requests.threshold_ms, "samples": list(metrics.slow_requests.samples)}
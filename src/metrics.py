@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Metrics Config
+METRICS_SLOW_REQUEST_MS = float(os.environ.get("METRICS_SLOW_REQUEST_MS", 0))   # 0 disables the slow-request sampler
+METRICS_SLOW_SAMPLES = int(os.environ.get("METRICS_SLOW_SAMPLES", 50))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_log = logging.getLogger("railpulse.slow_requests")
+
+# Per-request stage totals ({stage: seconds}); shared by reference with threadpool calls and tasks the request starts
+_request_stages = ContextVar("request_stages", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names, values, le=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, values)} {count}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set, in Prometheus' layout."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def count(self, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, values, bound)} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, values, '+Inf')} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, values)} {series[-1]}")
+        return lines
+
+
+request_duration = Histogram(
+    "railpulse_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+)
+stage_duration = Histogram(
+    "railpulse_stage_duration_seconds", "Time spent per stage (upstream, db, password_hash, serialization).", ("stage",),
+)
+upstream_requests = Counter(
+    "railpulse_upstream_requests_total", "Huxley calls by outcome (ok, error, timeout, circuit_open).", ("outcome",),
+)
+board_fallbacks = Counter(
+    "railpulse_board_fallbacks_total", "Failed board fetches answered with the last good board or none.", ("result",),
+)
+
+# name -> callable returning {metric: number}; read at scrape time (cache and pool stats)
+_gauge_sources = {}
+
+def register_gauges(prefix, source):
+    _gauge_sources[prefix] = source
+
+
+def record_stage(name, seconds):
+    stage_duration.observe(seconds, name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    # Times a block (sync or inside a coroutine) as one stage of the current request
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+class SlowRequestSampler:
+    """Keeps (and logs) the stage breakdown of requests slower than a threshold."""
+
+    def __init__(self, threshold_ms=METRICS_SLOW_REQUEST_MS, samples=METRICS_SLOW_SAMPLES):
+        self.threshold_ms = threshold_ms
+        self.samples = deque(maxlen=samples)
+
+    def offer(self, method, route, status, seconds, stages):
+        if not self.threshold_ms or seconds * 1000 < self.threshold_ms:
+            return
+        accounted = sum(stages.values())
+        sample = {
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            "stages_ms": {name: round(value * 1000, 2) for name, value in sorted(stages.items())},
+            "other_ms": round(max(0.0, seconds - accounted) * 1000, 2),
+            "at": time.time(),
+        }
+        self.samples.append(sample)
+        slow_log.warning("slow request %s", json.dumps(sample))
+
+
+slow_requests = SlowRequestSampler()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template, with its stage breakdown."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stages = {}
+        token = _request_stages.set(stages)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stages.reset(token)
+            # Route template, not the raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_duration.observe(elapsed, scope["method"], route, status)
+            slow_requests.offer(scope["method"], route, status, elapsed, stages)
+
+
+def _render_gauges():
+    lines = []
+    for prefix, source in _gauge_sources.items():
+        try:
+            values = source()
+        except Exception:
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"railpulse_{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return lines
+
+def render():
+    # Prometheus text exposition format (0.0.4)
+    lines = []
+    for metric in (request_duration, stage_duration, upstream_requests, board_fallbacks):
+        lines += metric.render()
+    lines += _render_gauges()
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 import uuid
 from src.database import Base
 
@@ -28,5 +29,51 @@ class Incident(Base):
     type = Column(String)
     severity = Column(Integer)
     description = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    station_code = Column(String, index=True, default="LDS")
\ No newline at end of file
+    # Set in Python too so every row carries full (microsecond) precision for keyset paging
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    station_code = Column(String, index=True, default="LDS")
+
+    # Hub health scans one station's recent reports; my-reports pages one owner's newest first
+    __table_args__ = (
+        Index("ix_incidents_station_created", "station_code", "created_at"),
+        Index("ix_incidents_owner_created", "owner_id", "created_at", "id"),
+    )
+
+class IncidentRollup(Base):
+    # Per-station, per-minute, per-type report aggregates, kept in step with incidents (see rollups.py)
+    __tablename__ = "incident_rollups"
+    station_code = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    severity_sum = Column(Integer, nullable=False, default=0)
+    severity_max = Column(Integer, nullable=False, default=0)
+
+
+class StressSnapshot(Base):
+    # Append-only stress index samples (ts = epoch seconds, so buckets are plain integer maths)
+    __tablename__ = "stress_snapshots"
+    station_code = Column(String, primary_key=True)
+    ts = Column(BigInteger, primary_key=True)
+    stress_index = Column(Float, nullable=False)
+    hub_status = Column(String)
+    cancellations = Column(Integer, default=0)
+    avg_delay = Column(Float, default=0)
+    passenger_reports = Column(Integer, default=0)
+    avg_report_severity = Column(Float, default=0)
+
+    # Compaction reads and retention deletes range over ts across all stations
+    __table_args__ = (Index("ix_stress_snapshots_ts", "ts"),)
+
+
+class StressSnapshotHourly(Base):
+    # Hourly downsample of stress_snapshots, kept long after raw samples expire
+    __tablename__ = "stress_snapshots_hourly"
+    station_code = Column(String, primary_key=True)
+    ts = Column(BigInteger, primary_key=True)  # start of the hour
+    samples = Column(Integer, nullable=False)
+    stress_sum = Column(Float, nullable=False)
+    stress_max = Column(Float, nullable=False)
+    avg_delay_sum = Column(Float, nullable=False)
+    cancellations_max = Column(Integer, nullable=False)
+    passenger_reports_max = Column(Integer, nullable=False)
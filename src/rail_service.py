@@ -1,104 +1,389 @@
+import asyncio
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+import tempfile
+import threading
+import time
+from . import delays, metrics, rate_limit, shared_board_cache
+from .board import Board
+from .board_cache import BoardCache
+from .rate_limit import RateLimited, RateLimiter
+from .resilience import CircuitBreaker, CircuitBreakerGroup, CircuitOpen, backoff_delay
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 load_dotenv()
 
-BASE_URL = "https://huxley2.azurewebsites.net"
+BASE_URL = os.environ.get("HUXLEY_BASE_URL", "https://huxley2.azurewebsites.net")
 TOKEN = os.environ.get("OLDBWS_TOKEN")
 
+# Upstream HTTP client (seconds / connection counts)
+HUXLEY_CONNECT_TIMEOUT = float(os.environ.get("HUXLEY_CONNECT_TIMEOUT", 3.05))
+HUXLEY_READ_TIMEOUT = float(os.environ.get("HUXLEY_READ_TIMEOUT", 10))
+HUXLEY_MAX_CONNECTIONS = int(os.environ.get("HUXLEY_MAX_CONNECTIONS", 20))
+HUXLEY_MAX_KEEPALIVE = int(os.environ.get("HUXLEY_MAX_KEEPALIVE", 10))
+HUXLEY_KEEPALIVE_EXPIRY = float(os.environ.get("HUXLEY_KEEPALIVE_EXPIRY", 30))
+HUXLEY_MAX_CONCURRENCY = int(os.environ.get("HUXLEY_MAX_CONCURRENCY", 10))
+
+# Upstream resilience: one deadline per board fetch covers queueing, every attempt and the backoff between them
+HUXLEY_DEADLINE = float(os.environ.get("HUXLEY_DEADLINE", 12))
+HUXLEY_RETRIES = int(os.environ.get("HUXLEY_RETRIES", 2))
+HUXLEY_RETRY_BASE = float(os.environ.get("HUXLEY_RETRY_BASE", 0.2))
+HUXLEY_RETRY_MAX = float(os.environ.get("HUXLEY_RETRY_MAX", 2))
+HUXLEY_BREAKER_THRESHOLD = int(os.environ.get("HUXLEY_BREAKER_THRESHOLD", 5))   # consecutive failed fetches
+HUXLEY_BREAKER_RESET = float(os.environ.get("HUXLEY_BREAKER_RESET", 30))        # seconds before a probe
+
+# Upstream quota: token bucket shared by every worker (0 = unlimited)
+HUXLEY_RATE_LIMIT = float(os.environ.get("HUXLEY_RATE_LIMIT", 0))                # requests per second
+HUXLEY_RATE_BURST = float(os.environ.get("HUXLEY_RATE_BURST", max(1.0, HUXLEY_RATE_LIMIT)))
+HUXLEY_RATE_RESERVE = float(os.environ.get("HUXLEY_RATE_RESERVE", 0.25))          # share of the burst background fetches can't use
+HUXLEY_RATE_BACKEND = os.environ.get("HUXLEY_RATE_BACKEND", "file")               # local, file (one host) or redis
+HUXLEY_RATE_FILE = os.environ.get("HUXLEY_RATE_FILE", os.path.join(tempfile.gettempdir(), "railpulse-huxley.bucket"))
+HUXLEY_RATE_REDIS_URL = os.environ.get("HUXLEY_RATE_REDIS_URL", "redis://localhost:6379/0")
+
+# Board Cache (seconds)
+BOARD_CACHE_TTL = float(os.environ.get("BOARD_CACHE_TTL", 30))
+BOARD_CACHE_STALE_TTL = float(os.environ.get("BOARD_CACHE_STALE_TTL", 300))
+BOARD_CACHE_MAX_STATIONS = int(os.environ.get("BOARD_CACHE_MAX_STATIONS", 256))
+# "shared": one mmap'd cache for every worker on the host (POSIX), instead of a copy per worker
+BOARD_CACHE_BACKEND = os.environ.get("BOARD_CACHE_BACKEND", "memory")
+BOARD_CACHE_SHARED_PATH = os.environ.get(
+    "BOARD_CACHE_SHARED_PATH",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "railpulse-boards"),
+)
+BOARD_CACHE_SLOT_BYTES = int(os.environ.get("BOARD_CACHE_SLOT_BYTES", 64 * 1024))   # max encoded board size
+
+if BOARD_CACHE_BACKEND == "shared" and shared_board_cache.fcntl is not None:
+    # Store times are compared across processes, so use the wall clock
+    board_cache = BoardCache(
+        ttl=BOARD_CACHE_TTL,
+        stale_ttl=BOARD_CACHE_STALE_TTL,
+        max_entries=BOARD_CACHE_MAX_STATIONS,
+        clock=time.time,
+        backend=shared_board_cache.SharedMemoryBackend(
+            BOARD_CACHE_SHARED_PATH, slots=BOARD_CACHE_MAX_STATIONS, slot_size=BOARD_CACHE_SLOT_BYTES,
+        ),
+    )
+else:
+    board_cache = BoardCache(
+        ttl=BOARD_CACHE_TTL,
+        stale_ttl=BOARD_CACHE_STALE_TTL,
+        max_entries=BOARD_CACHE_MAX_STATIONS,
+    )
+
+# Concurrent misses/refreshes for one station share a single upstream call
+board_flights = SingleFlight()
+async_board_flights = AsyncSingleFlight()
+
+# Shared by every station: Huxley is one upstream, and when it is unreachable it is for all of them
+breaker = CircuitBreaker(failure_threshold=HUXLEY_BREAKER_THRESHOLD, reset_timeout=HUXLEY_BREAKER_RESET)
+# 5xx answers mean Huxley is up but failing that request (e.g. an unsupported station code), so they
+# count against the station's own breaker and can't cut off live data for the healthy stations
+station_breakers = CircuitBreakerGroup(failure_threshold=HUXLEY_BREAKER_THRESHOLD, reset_timeout=HUXLEY_BREAKER_RESET)
+
+rate_limiter = None
+if HUXLEY_RATE_LIMIT > 0:
+    rate_limiter = RateLimiter(
+        HUXLEY_RATE_LIMIT,
+        HUXLEY_RATE_BURST,
+        reserve=HUXLEY_RATE_BURST * HUXLEY_RATE_RESERVE,
+        backend=rate_limit.make_backend(HUXLEY_RATE_BACKEND, HUXLEY_RATE_BURST, path=HUXLEY_RATE_FILE, url=HUXLEY_RATE_REDIS_URL),
+    )
+
+# Sync client: one keep-alive session shared by the threadpool
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HUXLEY_MAX_CONNECTIONS))
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=HUXLEY_MAX_CONNECTIONS))
+_sync_limiter = threading.BoundedSemaphore(HUXLEY_MAX_CONCURRENCY)
+
+# Async client: opened and closed by the app lifespan (aopen/aclose)
+_async_client = None
+_async_limiter = None
+_async_loop = None
+
 def get_live_arrivals(hub_code="LDS"):
+    # Served from the board cache; upstream is only hit on a miss or a stale refresh
+    try:
+        return board_cache.get_or_load(hub_code.upper(), load_board, refresh=prefetch_board)
+    except Exception:
+        return last_good_board(hub_code.upper())
+
+async def get_live_arrivals_async(hub_code="LDS"):
+    try:
+        return await board_cache.aget_or_load(hub_code.upper(), load_board_async, refresh=prefetch_board_async)
+    except Exception:
+        return last_good_board(hub_code.upper())
+
+def last_good_board(hub_code):
+    # Cached boards outlive their TTL until evicted, so a failed fetch can still answer with real (stale) data.
+    # With nothing cached the board is marked unavailable rather than looking like an empty, healthy station.
+    # The cache hands back a stale-flagged copy; the board other requests hold is left as it was.
+    board = board_cache.mark_stale(hub_code)
+    if board is None:
+        metrics.board_fallbacks.inc("unavailable")
+        return Board("Unknown")
+    metrics.board_fallbacks.inc("stale")
+    return board
+
+def load_board(hub_code):
+    try:
+        return board_flights.do(hub_code, fetch_live_arrivals, hub_code)
+    except Exception:
+        # A failed refresh means the cached board is no longer being kept current
+        board_cache.mark_stale(hub_code)
+        raise
+
+async def load_board_async(hub_code):
+    try:
+        return await async_board_flights.do(hub_code, fetch_live_arrivals_async, hub_code)
+    except Exception:
+        board_cache.mark_stale(hub_code)
+        raise
+
+# Fetches nobody is waiting on (stale refreshes, the poller): they queue behind user-facing ones for quota
+def prefetch_board(hub_code):
+    with rate_limit.background():
+        return load_board(hub_code)
+
+async def prefetch_board_async(hub_code):
+    with rate_limit.background():
+        return await load_board_async(hub_code)
+
+def cache_stats():
+    stats = board_cache.stats()
+    stats["single_flight"] = board_flights.stats()
+    stats["async_single_flight"] = async_board_flights.stats()
+    stats["circuit_breaker"] = breaker.stats()
+    stats["station_circuit_breakers"] = station_breakers.stats()
+    stats["rate_limit"] = rate_limiter.stats() if rate_limiter is not None else None
+    return stats
+
+def _board_url(hub_code):
     # Using /all/ to capture both Arrivals and Departures
-    url = f"{BASE_URL}/all/{hub_code}/50?accessToken={TOKEN}&expand=true"
-    
+    return f"{BASE_URL}/all/{hub_code}/50?accessToken={TOKEN}&expand=true"
+
+def _count_upstream(error):
+    if error is None:
+        metrics.upstream_requests.inc("ok")
+    elif isinstance(error, CircuitOpen):
+        metrics.upstream_requests.inc("circuit_open")
+    elif isinstance(error, RateLimited):
+        metrics.upstream_requests.inc("rate_limited")
+    elif isinstance(error, (requests.Timeout, httpx.TimeoutException, TimeoutError)):
+        metrics.upstream_requests.inc("timeout")
+    else:
+        metrics.upstream_requests.inc("error")
+
+def _upstream_fault(error):
+    # 4xx (bar 429) means Huxley answered and the request was wrong: no retry, and no mark against the breaker
+    if isinstance(error, RateLimited):
+        return False
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+def _retry_delay(error, attempt, deadline):
+    # Seconds to back off before the next attempt, or None to give up
+    if attempt >= HUXLEY_RETRIES or not _upstream_fault(error):
+        return None
+    delay = backoff_delay(attempt, HUXLEY_RETRY_BASE, HUXLEY_RETRY_MAX)
+    return delay if time.monotonic() + delay < deadline else None
+
+def _station_fault(error):
+    # A 5xx is an answer: Huxley is reachable, and the failure is charged to the station asked for
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+def _finish(error, hub_code):
+    if isinstance(error, RateLimited):
+        return  # never reached Huxley, so says nothing about its health
+    station = station_breakers.get(hub_code)
+    if error is None or not _upstream_fault(error):
+        breaker.record_success()
+        station.record_success()
+    elif _station_fault(error):
+        breaker.record_success()
+        station.record_failure()
+    else:
+        breaker.record_failure()
+
+def _admit(hub_code):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        # 1. CAPTURE THE FULL STATION NAME
-        station_name = data.get("locationName", hub_code) 
-        
-        trains = data.get("trainServices")
-        if not trains:
-            return {"station_name": station_name, "trains": []}
-
-        all_trains = []
-        
-        for train in trains:
-            # Safe Origin Parsing
-            origin_list = train.get("origin", [])
-            if origin_list:
-                origin_crs = origin_list[0].get("crs")
-                origin_name = origin_list[0].get("locationName")
-            else:
-                origin_crs = "UNK"
-                origin_name = "Unknown Origin"
-            
-            # Time Parsing (Arrivals vs Starts)
-            sta = train.get("sta") 
-            eta = train.get("eta")
-            
-            if not sta:
-                sta = train.get("std")
-                eta = train.get("etd")
-            
-            status = "On Time"
-            delay_minutes = 0
-            
-            # Delay Logic
-            if eta == "Cancelled":
-                status = "Cancelled"
-                delay_minutes = 60 
-            elif eta == "On time":
-                status = "On Time"
-                delay_minutes = 0
-            elif eta and ":" in eta and sta and ":" in sta: 
-                try:
-                    t_sta = datetime.strptime(sta, "%H:%M")
-                    t_eta = datetime.strptime(eta, "%H:%M")
-                    diff_mins = (t_eta - t_sta).total_seconds() / 60.0
-                    
-                    if diff_mins < -720: diff_mins += 1440
-                    
-                    delay_minutes = max(0, int(diff_mins))
-                    if delay_minutes > 0: status = "Delayed"
-                except (ValueError, TypeError):
-                    delay_minutes = 0
-
-            # Refund Logic
-            operator = train.get("operator", "")
-            refund_eligible = delay_minutes >= 15
-
-            all_trains.append({
-                "from_code": origin_crs,
-                "from_name": origin_name,
-                "origin_city": origin_name,
-                "scheduled": sta,
-                "estimated": eta,
-                "status": status,
-                "delay_weight": delay_minutes,
-                "platform": train.get("platform"),
-                "operator": operator,
-                "refund_eligible": refund_eligible,
-                "length": train.get("length", 0),
-                "delay_reason": train.get("delayReason"),
-                "train_id": train.get("serviceId")
-            })
-                
-        # 2. RETURN DICTIONARY (Fixes your error)
-        return {
-            "station_name": station_name,
-            "trains": all_trains
-        }
-
-    except Exception as e:
-        return {"station_name": "Unknown", "trains": []}
+        probe = breaker.before_call()
+        try:
+            station_breakers.get(hub_code).before_call()
+        except CircuitOpen:
+            # Refused by the station's breaker: hand the shared probe back rather than leave it stuck
+            if probe:
+                breaker.release_probe()
+            raise
+    except CircuitOpen as e:
+        _count_upstream(e)
+        raise
+
+def _fetch_once(hub_code, deadline):
+    if rate_limiter is not None:
+        with metrics.stage("upstream_throttle"):
+            rate_limiter.acquire(deadline - time.monotonic())
+    remaining = deadline - time.monotonic()
+    if not _sync_limiter.acquire(timeout=max(0, remaining)):
+        raise TimeoutError("Timed out waiting for an upstream slot")
+    try:
+        remaining = max(0.01, deadline - time.monotonic())
+        response = _session.get(
+            _board_url(hub_code),
+            timeout=(min(HUXLEY_CONNECT_TIMEOUT, remaining), min(HUXLEY_READ_TIMEOUT, remaining)),
+        )
+    finally:
+        _sync_limiter.release()
+    response.raise_for_status()
+    return response.json()
+
+def fetch_live_arrivals(hub_code="LDS"):
+    # Uncached upstream call. Raises on failure so errors never land in the cache.
+    _admit(hub_code)
+    deadline = time.monotonic() + HUXLEY_DEADLINE
+    attempt = 0
+    while True:
+        try:
+            with metrics.stage("upstream"):
+                data = _fetch_once(hub_code, deadline)
+        except Exception as e:
+            _count_upstream(e)
+            delay = _retry_delay(e, attempt, deadline)
+            if delay is None:
+                _finish(e, hub_code)
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        _count_upstream(None)
+        _finish(None, hub_code)
+        return parse_board(data, hub_code)
+
+def _new_async_client():
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HUXLEY_READ_TIMEOUT, connect=HUXLEY_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=HUXLEY_MAX_CONNECTIONS,
+            max_keepalive_connections=HUXLEY_MAX_KEEPALIVE,
+            keepalive_expiry=HUXLEY_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+def _get_async_client():
+    # (client, limiter) opened by the app lifespan, or None when running on another loop
+    if _async_client is None or _async_loop is not asyncio.get_running_loop():
+        return None
+    return _async_client, _async_limiter
+
+async def _request_board(client, hub_code):
+    response = await client.get(_board_url(hub_code))
+    response.raise_for_status()
+    return response.json()
+
+async def _fetch_once_async(hub_code):
+    shared = _get_async_client()
+    if shared is None:
+        # Outside the app's loop (scripts, tests): a short-lived client, closed before returning
+        async with _new_async_client() as client:
+            return await _request_board(client, hub_code)
+    client, limiter = shared
+    async with limiter:
+        return await _request_board(client, hub_code)
+
+async def fetch_live_arrivals_async(hub_code="LDS"):
+    _admit(hub_code)
+    deadline = time.monotonic() + HUXLEY_DEADLINE
+    attempt = 0
+    while True:
+        try:
+            if rate_limiter is not None:
+                with metrics.stage("upstream_throttle"):
+                    await rate_limiter.acquire_async(deadline - time.monotonic())
+            with metrics.stage("upstream"):
+                data = await asyncio.wait_for(_fetch_once_async(hub_code), max(0.01, deadline - time.monotonic()))
+        except Exception as e:
+            _count_upstream(e)
+            delay = _retry_delay(e, attempt, deadline)
+            if delay is None:
+                _finish(e, hub_code)
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        _count_upstream(None)
+        _finish(None, hub_code)
+        return parse_board(data, hub_code)
+
+async def aopen():
+    # Pooled client for the app's event loop; a client is tied to the loop it was opened on
+    global _async_client, _async_limiter, _async_loop
+    await aclose()
+    _async_client = _new_async_client()
+    _async_limiter = asyncio.Semaphore(HUXLEY_MAX_CONCURRENCY)
+    _async_loop = asyncio.get_running_loop()
+
+async def aclose():
+    global _async_client, _async_limiter, _async_loop
+    client = _async_client
+    _async_client = _async_limiter = _async_loop = None
+    if client is not None:
+        await client.aclose()
+
+def parse_board(data, hub_code):
+    # 1. CAPTURE THE FULL STATION NAME
+    station_name = data.get("locationName", hub_code) 
+    board = Board(station_name, fetched_at=time.time())
+    
+    trains = data.get("trainServices")
+    if not trains:
+        return board
+
+    scheduled = []
+    estimated = []
+    for train in trains:
+        # Time Parsing (Arrivals vs Starts)
+        sta = train.get("sta") 
+        eta = train.get("eta")
+        if not sta:
+            sta = train.get("std")
+            eta = train.get("etd")
+        scheduled.append(sta)
+        estimated.append(eta)
+
+    # Delay Logic (whole board at once, see delays.py)
+    statuses, delay_minutes = delays.classify_many(scheduled, estimated)
+
+    for i, train in enumerate(trains):
+        # Safe Origin Parsing
+        origin_list = train.get("origin", [])
+        if origin_list:
+            origin_crs = origin_list[0].get("crs")
+            origin_name = origin_list[0].get("locationName")
+        else:
+            origin_crs = "UNK"
+            origin_name = "Unknown Origin"
+
+        # Columns, not per-train dicts (refund eligibility is derived from the delay)
+        board.append(
+            origin_crs, origin_name, scheduled[i], estimated[i], statuses[i], delay_minutes[i],
+            platform=train.get("platform"),
+            operator=train.get("operator", ""),
+            length=train.get("length", 0),
+            delay_reason=train.get("delayReason"),
+            train_id=train.get("serviceId"),
+        )
+
+    return board
 
 if __name__ == "__main__":
     print("Scanning for all trains (Arrivals & Departures)...\n")
     results = get_live_arrivals()
-    print(f"Found {len(results['trains'])} relevant trains.")
-    for t in results['trains']:
+    print(f"Found {len(results)} relevant trains.")
+    for t in results.rows():
         print(f" -> [{t['operator']}] {t['scheduled']} from {t['from_name']}: {t['status']} ({t['estimated']})")
\ No newline at end of file
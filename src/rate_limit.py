@@ -0,0 +1,256 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so buckets can only be process-local
+    fcntl = None
+
+try:
+    import redis
+except ImportError:  # optional; only needed for the redis backend
+    redis = None
+
+# Priority lanes: user-facing fetches may spend the whole bucket, background ones must leave the reserve
+USER = "user"
+BACKGROUND = "background"
+
+# Lane of the upstream call being made; background work (poller, stale refreshes) sets it around its fetches
+current_lane = ContextVar("upstream_lane", default=USER)
+
+@contextmanager
+def background():
+    token = current_lane.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+class RateLimited(Exception):
+    """No token became available within the caller's time budget."""
+
+
+def refill_and_take(tokens, updated_at, now, rate, capacity, floor):
+    # Pure token-bucket step shared by the backends: (tokens, updated_at, wait); wait == 0 means one token was taken.
+    # `floor` is how many tokens must remain after the take (the user-lane reserve for background callers).
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens - 1 >= floor:
+        return tokens - 1, now, 0.0
+    return tokens, now, (floor + 1 - tokens) / rate
+
+
+class LocalBucket:
+    """Bucket state in this process only."""
+
+    def __init__(self, capacity, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    def take(self, rate, capacity, floor):
+        with self._lock:
+            self._tokens, self._updated_at, wait = refill_and_take(
+                self._tokens, self._updated_at, self._clock(), rate, capacity, floor,
+            )
+            return wait
+
+
+class FileBucket:
+    """Bucket state in a 16-byte memory-mapped file, updated under flock, shared by every worker on the host."""
+
+    _STATE = struct.Struct("dd")  # tokens, updated_at (epoch seconds)
+
+    def __init__(self, path, capacity, clock=time.time):
+        if fcntl is None:
+            raise RuntimeError("The file rate limit backend needs fcntl (POSIX)")
+        self.path = path
+        self.capacity = capacity
+        self._clock = clock
+        self._lock = threading.Lock()  # flock is per open file, so threads of one worker serialise here
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        # Opened per process: a descriptor inherited over fork shares its flock with the parent
+        if self._pid == os.getpid():
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self._STATE.size:
+                # First worker in: start with a full bucket
+                os.ftruncate(self._fd, self._STATE.size)
+                os.pwrite(self._fd, self._STATE.pack(self.capacity, self._clock()), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self._STATE.size)
+        self._pid = os.getpid()
+
+    def take(self, rate, capacity, floor):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                tokens, updated_at = self._STATE.unpack_from(self._map, 0)
+                tokens, updated_at, wait = refill_and_take(tokens, updated_at, self._clock(), rate, capacity, floor)
+                self._STATE.pack_into(self._map, 0, tokens, updated_at)
+                return wait
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._map.close()
+            os.close(self._fd)
+        self._pid = self._fd = self._map = None
+
+
+class RedisBucket:
+    """Bucket state in Redis, for workers spread over several hosts. Uses the server clock."""
+
+    # Same step as refill_and_take, atomically on the server; returns the wait in microseconds
+    _SCRIPT = """
+local rate, capacity, floor = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens - 1 >= floor then tokens = tokens - 1 else wait = (floor + 1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return math.ceil(wait * 1000000)
+"""
+
+    def __init__(self, url, key):
+        if redis is None:
+            raise RuntimeError("The redis rate limit backend needs the redis package")
+        self._key = key
+        self._script = redis.Redis.from_url(url).register_script(self._SCRIPT)
+
+    def take(self, rate, capacity, floor):
+        return int(self._script(keys=[self._key], args=[rate, capacity, floor])) / 1_000_000
+
+
+class RateLimiter:
+    """Token bucket with priority lanes over a pluggable state backend.
+
+    Tokens refill at `rate` per second up to `capacity`. Background callers only
+    take a token while more than `reserve` remain, so user-facing fetches keep
+    headroom at peak; within a worker, background callers also yield while a
+    user-lane caller is waiting.
+    """
+
+    def __init__(self, rate, capacity, reserve=0, backend=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = min(reserve, capacity - 1)
+        self.backend = backend or LocalBucket(capacity)
+        self._lock = threading.Lock()
+        self._user_waiting = 0
+
+        # Counters
+        self.granted = {USER: 0, BACKGROUND: 0}
+        self.throttled = {USER: 0, BACKGROUND: 0}
+        self.rejected = {USER: 0, BACKGROUND: 0}
+        self.wait_total = 0.0
+
+    def _poll(self, lane):
+        # Seconds until a token might be available for this lane (0 = taken)
+        if lane == BACKGROUND:
+            if self._user_waiting:
+                return 1.0 / self.rate
+            return self.backend.take(self.rate, self.capacity, self.reserve)
+        return self.backend.take(self.rate, self.capacity, 0)
+
+    def _waiting(self, lane, delta):
+        if lane == USER:
+            with self._lock:
+                self._user_waiting += delta
+
+    def _done(self, lane, waited, granted):
+        with self._lock:
+            if granted:
+                self.granted[lane] += 1
+            else:
+                self.rejected[lane] += 1
+            if waited:
+                self.throttled[lane] += 1
+                self.wait_total += waited
+
+    def acquire(self, timeout, lane=None):
+        # Blocks up to `timeout` seconds for a token; raises RateLimited past that
+        lane = lane or current_lane.get()
+        started = time.monotonic()
+        wait = self._poll(lane)
+        if wait:
+            self._waiting(lane, 1)
+            try:
+                while wait:
+                    remaining = timeout - (time.monotonic() - started)
+                    if wait > remaining:
+                        self._done(lane, time.monotonic() - started, False)
+                        raise RateLimited(f"No upstream token within {timeout:.1f}s")
+                    time.sleep(wait)
+                    wait = self._poll(lane)
+            finally:
+                self._waiting(lane, -1)
+            self._done(lane, time.monotonic() - started, True)
+        else:
+            self._done(lane, 0, True)
+
+    async def acquire_async(self, timeout, lane=None):
+        lane = lane or current_lane.get()
+        started = time.monotonic()
+        wait = self._poll(lane)
+        if wait:
+            self._waiting(lane, 1)
+            try:
+                while wait:
+                    remaining = timeout - (time.monotonic() - started)
+                    if wait > remaining:
+                        self._done(lane, time.monotonic() - started, False)
+                        raise RateLimited(f"No upstream token within {timeout:.1f}s")
+                    await asyncio.sleep(wait)
+                    wait = self._poll(lane)
+            finally:
+                self._waiting(lane, -1)
+            self._done(lane, time.monotonic() - started, True)
+        else:
+            self._done(lane, 0, True)
+
+    def stats(self):
+        with self._lock:
+            throttled = sum(self.throttled.values())
+            return {
+                "backend": type(self.backend).__name__,
+                "rate_per_second": self.rate,
+                "capacity": self.capacity,
+                "user_reserve": self.reserve,
+                "granted": dict(self.granted),
+                "throttled": dict(self.throttled),
+                "rejected": dict(self.rejected),
+                "user_waiting": self._user_waiting,
+                "wait_avg_ms": round(self.wait_total / throttled * 1000, 2) if throttled else 0,
+            }
+
+
+def make_backend(kind, capacity, path=None, url=None, key="railpulse:huxley"):
+    if kind == "file":
+        if fcntl is None:
+            return LocalBucket(capacity)
+        return FileBucket(path, capacity)
+    if kind == "redis":
+        return RedisBucket(url, key)
+    return LocalBucket(capacity)
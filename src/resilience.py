@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream the breaker considers down."""
+
+    def __init__(self, retry_in):
+        super().__init__(f"circuit open, retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fails fast once an upstream keeps failing, then lets a single probe through.
+
+    After `failure_threshold` consecutive failed calls the circuit opens and every
+    call is refused for `reset_timeout` seconds. The first call after that is a
+    probe (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_started = None  # set while the half-open probe is in flight
+
+        # Counters
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        # Raises CircuitOpen when the call must not go upstream; True when this call is the half-open probe
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            now = self._clock()
+            retry_in = self.opened_at + self.reset_timeout - now
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+            # A probe that never reported back (e.g. cancelled) stops blocking after another reset_timeout
+            if self.state == HALF_OPEN and (self._probe_started is None or now - self._probe_started > self.reset_timeout):
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            raise CircuitOpen(max(0.0, retry_in))
+
+    def release_probe(self):
+        # The probe was granted but the call never went out: the next caller may probe instead
+        with self._lock:
+            self._probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self.opened_at = self._clock()
+            self._probe_started = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+class CircuitBreakerGroup:
+    """One CircuitBreaker per key (e.g. per station), created on first use.
+
+    Only the `max_keys` most recently used keys are kept; a dropped key starts
+    over closed the next time it is used.
+    """
+
+    def __init__(self, max_keys=1024, **breaker_options):
+        self.max_keys = max_keys
+        self._options = breaker_options
+        self._breakers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(**self._options)
+                if len(self._breakers) > self.max_keys:
+                    self._breakers.popitem(last=False)
+            else:
+                self._breakers.move_to_end(key)
+            return breaker
+
+    def stats(self):
+        with self._lock:
+            breakers = list(self._breakers.items())
+        not_closed = sorted(key for key, breaker in breakers if breaker.state != CLOSED)
+        return {
+            "keys": len(breakers),
+            "not_closed": not_closed,
+            "not_closed_count": len(not_closed),
+            "opened": sum(breaker.opened for _, breaker in breakers),
+            "rejected": sum(breaker.rejected for _, breaker in breakers),
+        }
+
+
+def backoff_delay(attempt, base, cap, rng=random):
+    # "Full jitter": uniform over [0, min(cap, base * 2^attempt)], so retrying workers spread out
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+from . import ingestion, metrics, rail_service
+
+# Response Cache Config (seconds); defaults to how often the underlying board is refreshed
+RESPONSE_CACHE_TTL = float(os.environ.get(
+    "RESPONSE_CACHE_TTL",
+    ingestion.INGEST_INTERVAL if ingestion.INGEST_ENABLED else rail_service.BOARD_CACHE_TTL,
+))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+
+
+def make_etag(body):
+    # Strong validator from the bytes themselves, so it agrees across workers and restarts
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "version", "headers", "expires_at")
+
+    def __init__(self, body, version, headers, expires_at):
+        self.body = body
+        self.etag = make_etag(body)
+        self.version = version
+        self.headers = headers
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Serialized response bodies keyed by (route, station), each with a strong ETag.
+
+    A fresh entry answers both full requests and conditional ones (304) without
+    touching the board layer or the database. Entries tied to a board version
+    are replaced as soon as that version moves on.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def lookup(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= self._clock() or (version is not None and entry.version != version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key, render, version=None, headers=None):
+        # render() builds the body; skipped when the expired entry still holds this version's bytes
+        with self._lock:
+            previous = self._entries.get(key)
+        if previous is not None and version is not None and previous.version == version:
+            body = previous.body
+        else:
+            with metrics.stage("serialization"):
+                body = render()
+        entry = CachedResponse(body, version, headers or {}, self._clock() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def respond(self, entry, if_none_match=None, media_type="application/json"):
+        max_age = max(0, int(entry.expires_at - self._clock()))
+        headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={max_age}", **entry.headers}
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=media_type, headers=headers)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0,
+            "not_modified": self.not_modified,
+        }
+
+
+cache = ResponseCache()
+
+def reports_changed(station_codes):
+    # Health bodies include report stats, so drop them once a station's reports change
+    for code in set(station_codes):
+        cache.invalidate(("health", code.upper()))
@@ -0,0 +1,152 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func
+from sqlalchemy.orm import Session
+from . import database, models
+
+# Rolling per-minute incident aggregates.
+# Inserts add into their bucket with an upsert; updates and deletes rebuild the
+# affected bucket from the raw rows (a max can't be decremented). Reads sum the
+# buckets inside the window, so cost grows with minutes, not with reports.
+
+# Rollups Config: backfill the health window when the app starts (or run `python -m src.rollups` as a deploy step)
+ROLLUP_BACKFILL_ON_STARTUP = os.environ.get("ROLLUP_BACKFILL_ON_STARTUP", "true").lower() == "true"
+
+BUCKET = timedelta(minutes=1)
+rollup_table = models.IncidentRollup.__table__
+_KEY = ["station_code", "bucket_start", "type"]
+
+def bucket_of(moment):
+    return moment.replace(second=0, microsecond=0)
+
+def _aggregate(incidents):
+    # (station_code, type, severity, created_at) tuples -> one row per bucket key
+    buckets = {}
+    for station_code, incident_type, severity, created_at in incidents:
+        key = (station_code, bucket_of(created_at), incident_type)
+        row = buckets.get(key)
+        if row is None:
+            row = buckets[key] = {
+                "station_code": key[0], "bucket_start": key[1], "type": key[2],
+                "count": 0, "severity_sum": 0, "severity_max": 0,
+            }
+        row["count"] += 1
+        row["severity_sum"] += severity or 0
+        row["severity_max"] = max(row["severity_max"], severity or 0)
+    return list(buckets.values())
+
+def record(db: Session, incidents):
+    # Add new incidents to their buckets; runs inside the caller's transaction
+    rows = _aggregate(incidents)
+    if not rows:
+        return
+    stmt = database.upsert_insert(db, rollup_table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=_KEY,
+        set_={
+            "count": rollup_table.c.count + stmt.excluded.count,
+            "severity_sum": rollup_table.c.severity_sum + stmt.excluded.severity_sum,
+            "severity_max": case(
+                (stmt.excluded.severity_max > rollup_table.c.severity_max, stmt.excluded.severity_max),
+                else_=rollup_table.c.severity_max,
+            ),
+        },
+    )
+    db.execute(stmt)
+
+def rebuild(db: Session, station_buckets):
+    # Recompute whole (station_code, bucket_start) buckets from incidents after an update/delete
+    for station_code, bucket_start in set(station_buckets):
+        db.execute(delete(rollup_table).where(
+            rollup_table.c.station_code == station_code,
+            rollup_table.c.bucket_start == bucket_start,
+        ))
+        rows = db.query(
+            models.Incident.type,
+            func.count(models.Incident.id),
+            func.sum(models.Incident.severity),
+            func.max(models.Incident.severity),
+        ).filter(
+            models.Incident.station_code == station_code,
+            models.Incident.created_at >= bucket_start,
+            models.Incident.created_at < bucket_start + BUCKET,
+        ).group_by(models.Incident.type).all()
+        if not rows:
+            continue
+        stmt = database.upsert_insert(db, rollup_table).values([
+            {
+                "station_code": station_code, "bucket_start": bucket_start, "type": incident_type,
+                "count": count, "severity_sum": severity_sum or 0, "severity_max": severity_max or 0,
+            }
+            for incident_type, count, severity_sum, severity_max in rows
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=_KEY,
+            set_={name: stmt.excluded[name] for name in ("count", "severity_sum", "severity_max")},
+        ))
+
+def backfill(db: Session, since):
+    # Fill buckets that have no rollup yet (startup after deploy, or a worker that missed writes).
+    # Existing buckets are left alone so concurrent workers can't double count.
+    incidents = db.query(
+        models.Incident.station_code,
+        models.Incident.type,
+        models.Incident.severity,
+        models.Incident.created_at,
+    ).filter(models.Incident.created_at >= bucket_of(since)).yield_per(1000)
+    rows = _aggregate(incidents)
+    if rows:
+        db.execute(database.upsert_insert(db, rollup_table).values(rows).on_conflict_do_nothing(index_elements=_KEY))
+    db.commit()
+
+def window_rows(db: Session, station_codes, since):
+    # (station_code, type, count, severity_sum, severity_max) summed over the window's buckets
+    return db.query(
+        rollup_table.c.station_code,
+        rollup_table.c.type,
+        func.sum(rollup_table.c.count),
+        func.sum(rollup_table.c.severity_sum),
+        func.max(rollup_table.c.severity_max),
+    ).filter(
+        rollup_table.c.station_code.in_(list(station_codes)),
+        rollup_table.c.bucket_start >= bucket_of(since),
+    ).group_by(rollup_table.c.station_code, rollup_table.c.type).all()
+
+def trend(db: Session, station_code, since, step_minutes=15):
+    # Report volume/severity per step, oldest first, straight from the buckets
+    rows = db.query(
+        rollup_table.c.bucket_start,
+        func.sum(rollup_table.c.count),
+        func.sum(rollup_table.c.severity_sum),
+        func.max(rollup_table.c.severity_max),
+    ).filter(
+        rollup_table.c.station_code == station_code,
+        rollup_table.c.bucket_start >= bucket_of(since),
+    ).group_by(rollup_table.c.bucket_start).order_by(rollup_table.c.bucket_start).all()
+
+    step = timedelta(minutes=step_minutes)
+    origin = bucket_of(since)
+    points = {}
+    for bucket_start, count, severity_sum, severity_max in rows:
+        offset = (bucket_start.replace(tzinfo=None) - origin.replace(tzinfo=None)) // step
+        start = origin + offset * step
+        point = points.setdefault(start, {"bucket_start": start, "count": 0, "severity_sum": 0, "max_severity": 0})
+        point["count"] += count
+        point["severity_sum"] += severity_sum or 0
+        point["max_severity"] = max(point["max_severity"], severity_max or 0)
+
+    series = []
+    for point in points.values():
+        severity_sum = point.pop("severity_sum")
+        point["avg_severity"] = round(severity_sum / point["count"], 1) if point["count"] else 0
+        series.append(point)
+    return series
+
+
+if __name__ == "__main__":
+    from .hub_health import REPORT_WINDOW
+    db = database.SessionLocal()
+    try:
+        backfill(db, datetime.now() - REPORT_WINDOW)
+    finally:
+        db.close()
@@ -1,74 +1,167 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import asyncio
+import math
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from typing import List
-from .. import models, schemas, database, rail_service
+from typing import List, Optional
+from .. import schemas, async_database, rail_service, hub_health, ingestion, rollups, history, live_feed, board_diff, response_cache, serialization
 
 router = APIRouter(tags=["Analytics"])
 
+MAX_BATCH_STATIONS = 100
+
+def _board_headers(board, version):
+    # X-Board-Freshness: live, stale (last good board while upstream fails) or unavailable (empty list, no data)
+    headers = {"X-Board-Version": str(version), "X-Board-Freshness": board.freshness()}
+    if board.fetched_at:
+        headers["X-Board-Fetched-At"] = str(int(board.fetched_at))
+    return headers
+
 @router.get("/live/departures/{station_code}", response_model=List[schemas.TrainResponse])
-def get_live_departures(station_code: str):
-    # Fetch the full data
-    data = rail_service.get_live_arrivals(hub_code=station_code)
-    # Return the list of trains
-    return data.get("trains", [])
+async def get_live_departures(station_code: str, if_none_match: Optional[str] = Header(None)):
+    code = station_code.upper()
+    key = ("departures", code)
+    entry = response_cache.cache.lookup(key, version=ingestion.board_store.history.version(code))
+    if entry is None:
+        # Fetch the full data
+        board = await ingestion.get_board(station_code)
+        version = ingestion.board_store.history.version(code)
+        # Serialized straight from the board's columns (response_model documents the shape)
+        entry = response_cache.cache.store(
+            key, lambda: serialization.board_json(board), version=version, headers=_board_headers(board, version),
+        )
+    return response_cache.cache.respond(entry, if_none_match)
 
-@router.get("/analytics/{station_code}/health")
-def get_hub_health(station_code: str, db: Session = Depends(database.get_db)):
-    # Fetch Data 
-    service_response = rail_service.get_live_arrivals(hub_code=station_code)
-    
-    # Get data with defaults
-    rail_data = service_response.get("trains", [])       
-    full_station_name = service_response.get("station_name", "Unknown Station")
-
-    # Fetch User Reports
-    one_hour_ago = datetime.now() - timedelta(hours=1)
-    recent_reports = db.query(models.Incident).filter(
-        models.Incident.created_at >= one_hour_ago,
-        models.Incident.station_code == station_code 
-    ).all()
-
-    # Calculate Rail Metrics
-    cancelled_trains = len([t for t in rail_data if t['status'] == 'Cancelled'])
-    
-    active_trains = [t for t in rail_data if t['status'] != 'Cancelled']
-    avg_delay = 0
-    if active_trains:
-        avg_delay = sum(t['delay_weight'] for t in active_trains) / len(active_trains)
-
-    # Crowd Metrics
-    avg_severity = 0
-    if recent_reports:
-        avg_severity = sum(r.severity for r in recent_reports) / len(recent_reports)
-
-    # Score Algorithm (0.0 - 1.0)
-    score = (avg_severity / 5.0 * 0.4) + (min(avg_delay, 60) / 60.0 * 0.6)
-    
-    # Determine Status Band
-    status = "GREEN"
-    if score > 0.7: status = "RED"
-    elif score > 0.35: status = "AMBER"
-    
-    # Domain Override
-    if cancelled_trains > (len(rail_data) * 0.25): 
-        status = "Amber"
-        score = max(score, 0.35)
-    elif cancelled_trains > (len(rail_data) * 0.5):
-        status = "Red"
-        score = max(score, 0.7)
-    
-
-    return {
-        "station": full_station_name, 
-        "station_code": station_code,
+@router.get("/live/departures/{station_code}/changes")
+async def get_departure_changes(
+    station_code: str,
+    since: Optional[int] = Query(None, ge=0, description="Board version the client already holds (X-Board-Version)"),
+):
+    code = station_code.upper()
+    current = await ingestion.get_board(code)
+    version, board, diff = ingestion.board_store.history.changes(code, since)
+    if board is None:
+        # Nothing recorded: the station has never had data
+        board = current
+    if diff is None:
+        # Unknown or expired version: start over from the whole board
+        trains = [dict(row, key=board_diff.train_key(row)) for row in board.rows()]
+        return {"station_code": code, "version": version, "since": since, "freshness": board.freshness(), "full": True, "trains": trains}
+    return {"station_code": code, "version": version, "since": since, "freshness": board.freshness(), "full": False, **diff}
+
+@router.get("/live/cache/stats")
+def get_board_cache_stats():
+    return rail_service.cache_stats()
+
+@router.get("/live/ingestion/stats")
+def get_ingestion_stats():
+    return ingestion.poller.stats()
+
+@router.get("/live/stream")
+async def stream_live_feed(stations: str = Query(..., description="Comma-separated CRS codes, e.g. LDS,MAN,KGX")):
+    # Server-sent events: `health` and `departures` per station, pushed whenever they change
+    station_codes = list(dict.fromkeys(code.strip().upper() for code in stations.split(",") if code.strip()))
+    if not station_codes:
+        raise HTTPException(status_code=400, detail="No station codes supplied")
+    if len(station_codes) > MAX_BATCH_STATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_STATIONS} stations per request")
+
+    return StreamingResponse(
+        live_feed.feed.events(station_codes),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/live/stream/stats")
+def get_live_feed_stats():
+    return live_feed.feed.stats()
+
+@router.get("/analytics/health")
+async def get_multi_hub_health(
+    stations: str = Query(..., description="Comma-separated CRS codes, e.g. LDS,MAN,KGX"),
+    db: AsyncSession = Depends(async_database.get_async_read_db),
+):
+    # Dedupe (case-insensitively, like the single-station route) while keeping the caller's order
+    station_codes = list(dict.fromkeys(code.strip().upper() for code in stations.split(",") if code.strip()))
+    if not station_codes:
+        raise HTTPException(status_code=400, detail="No station codes supplied")
+    if len(station_codes) > MAX_BATCH_STATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_STATIONS} stations per request")
+
+    # Fan out the upstream fetches and run the grouped report query alongside them
+    boards, report_stats = await asyncio.gather(
+        asyncio.gather(*(ingestion.get_board(code) for code in station_codes)),
+        hub_health.recent_report_stats_async(db, station_codes),
+    )
+
+    result = {
         "timestamp": datetime.now(),
-        "hub_status": status,
-        "stress_index": round(score, 2),
-        "metrics": {
-            "cancellations": cancelled_trains,
-            "avg_delay": round(avg_delay, 1),
-            "passenger_reports": len(recent_reports),
-            "avg_report_severity": round(avg_severity, 1)
-        }
-    }
\ No newline at end of file
+        "stations": [
+            hub_health.compute_hub_health(code, board, report_stats[code])
+            for code, board in zip(station_codes, boards)
+        ],
+    }
+    if serialization.FAST_JSON:
+        return serialization.FastJSONResponse(result)
+    return result
+
+def _health_body(health):
+    if serialization.FAST_JSON:
+        return serialization.dumps(health)
+    return JSONResponse(jsonable_encoder(health)).body
+
+@router.get("/analytics/{station_code}/health")
+async def get_hub_health(
+    station_code: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(async_database.get_async_read_db),
+):
+    # Served from the response cache until it expires or a report for the station is written.
+    # One normalised code for the key, the board, the reports and the body, so "man" and "MAN" agree.
+    code = station_code.upper()
+    key = ("health", code)
+    entry = response_cache.cache.lookup(key)
+    if entry is None:
+        # Fetch Data 
+        board = await ingestion.get_board(code)
+
+        # Fetch User Reports (aggregated in SQL, awaited on the async engine)
+        report_stats = await hub_health.recent_report_stats_async(db, [code])
+
+        health = hub_health.compute_hub_health(code, board, report_stats[code])
+        entry = response_cache.cache.store(key, lambda: _health_body(health))
+    return response_cache.cache.respond(entry, if_none_match)
+
+@router.get("/analytics/{station_code}/reports/trend")
+async def get_report_trend(
+    station_code: str,
+    minutes: int = Query(180, ge=1, le=7 * 24 * 60),
+    step: int = Query(15, ge=1, le=24 * 60, description="Minutes per point"),
+    db: AsyncSession = Depends(async_database.get_async_read_db),
+):
+    code = station_code.upper()  # incidents are stored with upper-case codes
+    since = datetime.now() - timedelta(minutes=minutes)
+    series = await db.run_sync(rollups.trend, code, since, step)
+    return {"station_code": code, "step_minutes": step, "points": series}
+
+@router.get("/analytics/{station_code}/history")
+async def get_stress_history(
+    station_code: str,
+    start: Optional[datetime] = Query(None, alias="from", description="Defaults to 24h before `to`"),
+    end: Optional[datetime] = Query(None, alias="to", description="Defaults to now"),
+    step: int = Query(300, ge=60, description="Seconds per point"),
+    db: AsyncSession = Depends(async_database.get_async_read_db),
+):
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    # Round the end up so a snapshot taken this second is included
+    start_ts, end_ts = int(start.timestamp()), math.ceil(end.timestamp())
+    if end_ts <= start_ts:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end_ts - start_ts) // step > history.HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {history.HISTORY_MAX_POINTS} points per request; increase step")
+
+    points = await db.run_sync(history.query_history, station_code.upper(), start_ts, end_ts, step)
+    return {"station_code": station_code.upper(), "step_seconds": step, "points": points}
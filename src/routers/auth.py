@@ -1,29 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from .. import models, schemas, database, auth
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, async_database, auth
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Endpoints are async so bcrypt waits on the hasher pool, not on a request thread,
+# and the user lookups/writes go through the async engine.
+
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    if db.query(models.User).filter(models.User.email == user.email).first():
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(async_database.get_async_db)):
+    existing = await db.scalar(select(models.User.id).where(models.User.email == user.email).limit(1))
+    if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pwd = auth.get_password_hash(user.password)
-    new_user = models.User(email=user.email, hashed_password=hashed_pwd)
+    try:
+        hashed_pwd = await auth.password_hasher.hash(user.password)
+    except auth.PasswordHasherBusy:
+        raise auth.hasher_busy_exception()
+
+    new_user = models.User(email=user.email, hashed_password=hashed_pwd, is_active=True)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return new_user
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(async_database.get_async_db)):
     # OAuth2PasswordRequestForm expects 'username' and 'password' fields
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.username).limit(1))
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    try:
+        if auth.AUTH_REHASH_ON_LOGIN:
+            valid, new_hash = await auth.password_hasher.verify_and_update(form_data.password, user.hashed_password)
+        else:
+            valid, new_hash = await auth.password_hasher.verify(form_data.password, user.hashed_password), None
+    except auth.PasswordHasherBusy:
+        raise auth.hasher_busy_exception()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    
+
     # Create Token
-    access_token = auth.create_access_token(data={"sub": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    access_token = auth.create_user_token(user)
+
+    # Transparent upgrade to the current cost factor
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return {"access_token": access_token, "token_type": "bearer"}
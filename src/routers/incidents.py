@@ -1,40 +1,150 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Optional
+from datetime import datetime
+import base64
+import binascii
+import os
 import uuid
-from .. import models, schemas, database, auth
+from .. import models, schemas, async_database, auth, rollups, response_cache, serialization
 
 router = APIRouter(prefix="/incidents", tags=["Incidents"])
 
+# Async end to end on the async engine; the shared rollup helpers run on the
+# session's sync facade via run_sync.
+
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 500))
+
+# my-reports paging
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+INCIDENT_FIELDS = tuple(schemas.IncidentResponse.model_fields)  # selected in response order
+
 @router.post("/", response_model=schemas.IncidentResponse, status_code=status.HTTP_201_CREATED)
-def create_incident(
+async def create_incident(
     incident: schemas.IncidentCreate, 
     # SECURE: Get user from token automatically
-    current_user: models.User = Depends(auth.get_current_user), 
-    db: Session = Depends(database.get_db)
+    current_user: auth.CurrentUser = Depends(auth.get_current_user), 
+    db: AsyncSession = Depends(async_database.get_async_db)
 ):
     # We don't need to check if user exists; auth.get_current_user does that.
     new_report = models.Incident(**incident.dict(), owner_id=current_user.id)
     db.add(new_report)
-    db.commit()
-    db.refresh(new_report)
+    await db.flush()
+    await db.run_sync(rollups.record, [(new_report.station_code, new_report.type, new_report.severity, new_report.created_at)])
+    await db.commit()
+    response_cache.reports_changed([new_report.station_code])
     return new_report
 
+@router.post("/bulk", response_model=schemas.BulkIncidentResponse, status_code=status.HTTP_201_CREATED)
+async def create_incidents_bulk(
+    response: Response,
+    items: List[Any] = Body(...),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(async_database.get_async_db)
+):
+    # Offline replay: each item is validated on its own so one bad report doesn't sink the batch
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} incidents per request")
+
+    results = []
+    rows = []
+    row_indexes = []
+    for index, item in enumerate(items):
+        try:
+            incident = schemas.IncidentCreate.model_validate(item)
+        except ValidationError as e:
+            errors = [{"loc": err["loc"], "msg": err["msg"], "type": err["type"]} for err in e.errors()]
+            results.append({"index": index, "status": "invalid", "errors": errors})
+            continue
+        rows.append({**incident.model_dump(), "owner_id": current_user.id})
+        row_indexes.append(index)
+
+    # One multi-row INSERT ... RETURNING and one commit for the whole batch.
+    # Plain rows come back (not ORM objects), so nothing is reloaded after the commit;
+    # sort_by_parameter_order keeps them in input order so they line up with row_indexes.
+    if rows:
+        table = models.Incident.__table__
+        statement = insert(table).returning(*table.c, sort_by_parameter_order=True)
+        created = (await db.execute(statement, rows)).mappings().all()
+        await db.run_sync(rollups.record, [(r["station_code"], r["type"], r["severity"], r["created_at"]) for r in created])
+        await db.commit()
+        response_cache.reports_changed(r["station_code"] for r in created)
+        for index, incident in zip(row_indexes, created):
+            results.append({"index": index, "status": "created", "incident": incident})
+
+    results.sort(key=lambda r: r["index"])
+    if len(rows) < len(items):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return {"created": len(rows), "failed": len(items) - len(rows), "results": results}
+
+def _encode_cursor(created_at, incident_id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{incident_id}".encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        created_at, incident_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(incident_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/my-reports", response_model=List[schemas.IncidentResponse])
-def get_my_incidents(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+async def get_my_incidents(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    stream: bool = Query(False, description="Stream every report as NDJSON instead of one page"),
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(async_database.get_async_db)
 ):
-    return db.query(models.Incident).filter(models.Incident.owner_id == current_user.id).all()
+    # Keyset pagination, newest first, on (created_at, id) - backed by ix_incidents_owner_created
+    table = models.Incident.__table__
+    query = select(*(table.c[name] for name in INCIDENT_FIELDS)).where(table.c.owner_id == current_user.id)
+    if cursor:
+        query = query.where(tuple_(table.c.created_at, table.c.id) < tuple_(*_decode_cursor(cursor)))
+    query = query.order_by(table.c.created_at.desc(), table.c.id.desc())
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        if limit:
+            query = query.limit(limit)
+        # Rows are pulled from the cursor in batches and written as they arrive
+        async def ndjson_rows():
+            result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            if serialization.FAST_JSON:
+                # Rows already have the response's columns and order
+                async for row in result.mappings():
+                    yield serialization.dumps(dict(row)) + b"\n"
+                return
+            async for row in result.mappings():
+                yield schemas.IncidentResponse.model_validate(row).model_dump_json() + "\n"
+        return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    rows = (await db.execute(query.limit(page_size + 1))).mappings().all()
+    headers = {}
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = _encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    if serialization.FAST_JSON:
+        return serialization.FastJSONResponse([dict(row) for row in rows], headers=headers)
+    response.headers.update(headers)
+    return rows
 
 @router.put("/{incident_id}", response_model=schemas.IncidentResponse)
-def update_incident(
+async def update_incident(
     incident_id: uuid.UUID, 
     update_data: schemas.IncidentUpdate, 
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(async_database.get_async_db)
 ):
-    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
+    incident = await db.get(models.Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -46,21 +156,28 @@ def update_incident(
     if update_data.severity: incident.severity = update_data.severity
     if update_data.description: incident.description = update_data.description
     
-    db.commit()
-    db.refresh(incident)
+    # Type/severity feed the rollups; rebuild this incident's bucket
+    await db.flush()
+    await db.run_sync(rollups.rebuild, [(incident.station_code, rollups.bucket_of(incident.created_at))])
+    await db.commit()
+    response_cache.reports_changed([incident.station_code])
     return incident
 
 @router.delete("/{incident_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_incident(
+async def delete_incident(
     incident_id: uuid.UUID, 
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(database.get_db)
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(async_database.get_async_db)
 ):
-    incident = db.query(models.Incident).filter(models.Incident.id == incident_id).first()
+    incident = await db.get(models.Incident, incident_id)
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     if incident.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
-    db.delete(incident)
-    db.commit()
+    station_bucket = (incident.station_code, rollups.bucket_of(incident.created_at))
+    await db.delete(incident)
+    await db.flush()
+    await db.run_sync(rollups.rebuild, [station_bucket])
+    await db.commit()
+    response_cache.reports_changed([station_bucket[0]])
     return None
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Optional, List, Any
 from datetime import datetime
 import uuid
 
@@ -28,6 +28,12 @@ class IncidentCreate(BaseModel):
     severity: int
     description: Optional[str] = None
 
+    @field_validator("station_code")
+    @classmethod
+    def upper_station_code(cls, value):
+        # CRS codes are case-insensitive: stored upper-case so health, rollups and cache keys all agree
+        return value.upper()
+
 class IncidentUpdate(BaseModel):
     type: Optional[str] = None
     severity: Optional[int] = None
@@ -39,6 +45,17 @@ class IncidentResponse(IncidentCreate):
     created_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class BulkIncidentResult(BaseModel):
+    index: int
+    status: str  # "created" | "invalid"
+    incident: Optional[IncidentResponse] = None
+    errors: Optional[List[Any]] = None
+
+class BulkIncidentResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkIncidentResult]
+
 class TrainResponse(BaseModel):
     from_code: str
     from_name: str
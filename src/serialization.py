@@ -0,0 +1,47 @@
+import json
+import os
+from datetime import date, datetime
+from uuid import UUID
+from fastapi.responses import JSONResponse
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+# Opt-in: routes whose data the service layer already shaped return pre-encoded bodies,
+# skipping response_model re-validation and jsonable_encoder
+FAST_JSON = os.environ.get("FAST_JSON", "false").lower() == "true"
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(content):
+        # UTC datetimes end in "Z", as Pydantic writes them
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content):
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when installed (plain dicts/lists, datetimes and UUIDs)."""
+
+    def render(self, content):
+        with metrics.stage("serialization"):
+            return dumps(content)
+
+
+def board_json(board):
+    # orjson over the row dicts beats Board.to_json's string formatting; without it to_json is the fast path
+    if FAST_JSON and orjson is not None:
+        return dumps(board.rows())
+    return board.to_json()
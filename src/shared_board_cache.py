@@ -0,0 +1,247 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+
+from .board import ENCODING_VERSION, Board
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so the shared backend is unavailable
+    fcntl = None
+
+MAGIC = b"RPBC"
+# Boards are marshal-encoded, whose format can change between Python versions
+PY_VERSION = sys.version_info[0] * 100 + sys.version_info[1]
+
+_HEADER = struct.Struct("<4sHHIIQ")   # magic, encoding version, python version, slots, slot size, last generation
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<8sQddII")     # key, generation, stored_at, refresh_until, payload length, flags
+_EMPTY_KEY = b"\0" * 8
+_STALE = 1
+_PROBES = 8                           # slots tried per key before the oldest of them is evicted
+
+
+class SharedMemoryBackend:
+    """Board cache backend in one memory-mapped file shared by every worker on the host.
+
+    The file holds a header and a fixed number of fixed-size slots. Each slot holds
+    one station's board as Board.to_bytes(), plus its store time, a stale flag and a
+    cross-worker refresh claim. Keys are hashed into the slots; when all of a key's
+    probe slots are taken, the oldest board among them is evicted.
+
+    Readers take a shared flock and decode straight out of the mapping. Writers take
+    an exclusive one. Each worker keeps the board object it last decoded for each
+    station, tagged with the slot's generation, so repeated reads return the same
+    object (board versions and ETags depend on that) until another worker writes.
+    """
+
+    def __init__(self, path, slots=256, slot_size=64 * 1024):
+        if fcntl is None:
+            raise RuntimeError("The shared board cache needs fcntl (POSIX)")
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self._lock = threading.Lock()  # flock is per open file, so threads of one worker serialise here
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._decoded = {}  # raw key -> (generation, board)
+
+        # Counters (this worker)
+        self.decodes = 0
+        self.oversize = 0
+
+    # --- file handling ---
+
+    def _open(self):
+        # Opened per process: a descriptor inherited over fork shares its flock with the parent
+        if self._pid == os.getpid():
+            return
+        size = _HEADER_SIZE + self.slots * self.slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            expected = (MAGIC, ENCODING_VERSION, PY_VERSION, self.slots, self.slot_size)
+            if os.fstat(self._fd).st_size != size or len(header) < _HEADER.size or _HEADER.unpack(header)[:5] != expected:
+                # New file, or one written with another layout: start empty
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(*expected, 0), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._decoded = {}
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._map.close()
+                os.close(self._fd)
+            self._pid = self._fd = self._map = None
+            self._decoded = {}
+
+    # --- slots ---
+
+    @staticmethod
+    def _encode_key(key):
+        # CRS codes fit as-is; anything else (keys come from the URL) is stored as a hash
+        raw = key.encode("utf-8")
+        if len(raw) > 8 or not key.isascii() or raw.startswith(b"#"):
+            return b"#" + hashlib.blake2b(raw, digest_size=7).digest()
+        return raw.ljust(8, b"\0")
+
+    def _offset(self, index):
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _probe(self, raw_key):
+        start = zlib.crc32(raw_key) % self.slots
+        return [(start + i) % self.slots for i in range(min(_PROBES, self.slots))]
+
+    def _find(self, raw_key):
+        # (offset, slot fields) of the key's slot, or (None, None)
+        for index in self._probe(raw_key):
+            offset = self._offset(index)
+            fields = _SLOT.unpack_from(self._map, offset)
+            if fields[0] == raw_key:
+                return offset, fields
+        return None, None
+
+    def _write_fields(self, offset, fields):
+        _SLOT.pack_into(self._map, offset, *fields)
+
+    # --- backend interface (see board_cache.MemoryBackend) ---
+
+    def get(self, key):
+        raw_key = self._encode_key(key)
+        with self._locked(exclusive=False):
+            offset, fields = self._find(raw_key)
+            if offset is None:
+                return None, None
+            _, generation, stored_at, _, length, flags = fields
+            cached = self._decoded.get(raw_key)
+            if cached is not None and cached[0] == generation:
+                board = cached[1]
+            else:
+                start = offset + _SLOT.size
+                with memoryview(self._map) as view:
+                    board = Board.from_bytes(view[start:start + length])
+                self._decoded[raw_key] = (generation, board)
+                self.decodes += 1
+            if flags & _STALE and not board.stale:
+                # Flagged (by any worker) since it was decoded: memoise a flagged copy, leave the old object alone
+                board = board.as_stale()
+                self._decoded[raw_key] = (generation, board)
+            return board, stored_at
+
+    def set(self, key, board, stored_at):
+        payload = board.to_bytes()
+        if len(payload) > self.slot_size - _SLOT.size:
+            self.oversize += 1
+            return 0
+        raw_key = self._encode_key(key)
+        evicted = 0
+        with self._locked(exclusive=True):
+            offset, _ = self._find(raw_key)
+            if offset is None:
+                candidates = [self._offset(index) for index in self._probe(raw_key)]
+                empty = [o for o in candidates if self._map[o:o + 8] == _EMPTY_KEY]
+                if empty:
+                    offset = empty[0]
+                else:
+                    # Evict the oldest board among the probe slots
+                    offset = min(candidates, key=lambda o: _SLOT.unpack_from(self._map, o)[2])
+                    self._decoded.pop(self._map[offset:offset + 8], None)
+                    evicted = 1
+            magic, encoding, py_version, slots, slot_size, generation = _HEADER.unpack_from(self._map, 0)
+            generation += 1
+            _HEADER.pack_into(self._map, 0, magic, encoding, py_version, slots, slot_size, generation)
+            start = offset + _SLOT.size
+            self._map[start:start + len(payload)] = payload
+            self._write_fields(offset, (raw_key, generation, stored_at, 0.0, len(payload), 0))
+            self._decoded[raw_key] = (generation, board)
+        return evicted
+
+    def touch(self, key):
+        pass  # eviction is by age within the probe slots, not recency
+
+    def delete(self, key):
+        raw_key = self._encode_key(key)
+        with self._locked(exclusive=True):
+            offset, _ = self._find(raw_key)
+            if offset is not None:
+                self._write_fields(offset, (_EMPTY_KEY, 0, 0.0, 0.0, 0, 0))
+            self._decoded.pop(raw_key, None)
+
+    def clear(self):
+        with self._locked(exclusive=True):
+            for index in range(self.slots):
+                self._write_fields(self._offset(index), (_EMPTY_KEY, 0, 0.0, 0.0, 0, 0))
+            self._decoded = {}
+
+    def mark_stale(self, key):
+        raw_key = self._encode_key(key)
+        with self._locked(exclusive=True):
+            offset, fields = self._find(raw_key)
+            if offset is not None:
+                self._write_fields(offset, fields[:5] + (fields[5] | _STALE,))
+
+    def claim_refresh(self, key, now, until):
+        # True for the one worker that should refresh this board; the claim lapses at `until` if that worker dies
+        raw_key = self._encode_key(key)
+        with self._locked(exclusive=True):
+            offset, fields = self._find(raw_key)
+            if offset is None:
+                return True
+            if fields[3] > now:
+                return False
+            self._write_fields(offset, fields[:3] + (until,) + fields[4:])
+            return True
+
+    def release_refresh(self, key):
+        raw_key = self._encode_key(key)
+        with self._locked(exclusive=True):
+            offset, fields = self._find(raw_key)
+            if offset is not None:
+                self._write_fields(offset, fields[:3] + (0.0,) + fields[4:])
+
+    def stored_at(self):
+        with self._locked(exclusive=False):
+            entries = {}
+            for index in range(self.slots):
+                fields = _SLOT.unpack_from(self._map, self._offset(index))
+                if fields[0] != _EMPTY_KEY:
+                    entries[self._decode_key(fields[0])] = fields[2]
+            return entries
+
+    @staticmethod
+    def _decode_key(raw):
+        if raw.startswith(b"#"):
+            return raw.hex()
+        return raw.rstrip(b"\0").decode("ascii")
+
+    def stats(self):
+        return {
+            "type": type(self).__name__,
+            "path": self.path,
+            "slots": self.slots,
+            "slot_bytes": self.slot_size,
+            "decodes": self.decodes,
+            "oversize": self.oversize,
+        }
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; everyone who arrives while it
+    is in flight blocks on it and receives the same result (or the same exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": sorted(self._calls),
+            }
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight.
+
+    The shared call runs as its own task, so a caller that gets cancelled
+    (e.g. a client disconnect) does not cancel the fetch for everyone else.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": sorted(self._calls),
+        }
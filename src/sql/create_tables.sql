@@ -22,9 +22,59 @@ CREATE TABLE incidents (
     severity INTEGER NOT NULL, -- 1 to 5
     description TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    station_code VARCHAR(10) DEFAULT 'LDS',
 
     CONSTRAINT fk_user
       FOREIGN KEY(owner_id) 
       REFERENCES users(id)
       ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+CREATE INDEX ix_incidents_station_code ON incidents (station_code);
+
+-- Hub health: recent reports for one station
+CREATE INDEX ix_incidents_station_created ON incidents (station_code, created_at);
+
+-- My reports: keyset pagination on (created_at, id) per owner
+CREATE INDEX ix_incidents_owner_created ON incidents (owner_id, created_at, id);
+
+-- Per-station, per-minute report aggregates (maintained by the API on every incident write)
+CREATE TABLE incident_rollups (
+    station_code VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    severity_sum INTEGER NOT NULL DEFAULT 0,
+    severity_max INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (station_code, bucket_start, type)
+);
+
+
+-- Stress index history: append-only samples keyed by (station_code, ts), ts in epoch seconds.
+-- Retention is a range DELETE on ts (history.compact), backed by ix_stress_snapshots_ts.
+CREATE TABLE stress_snapshots (
+    station_code VARCHAR(10) NOT NULL,
+    ts BIGINT NOT NULL,
+    stress_index DOUBLE PRECISION NOT NULL,
+    hub_status VARCHAR(10),
+    cancellations INTEGER DEFAULT 0,
+    avg_delay DOUBLE PRECISION DEFAULT 0,
+    passenger_reports INTEGER DEFAULT 0,
+    avg_report_severity DOUBLE PRECISION DEFAULT 0,
+    PRIMARY KEY (station_code, ts)
+);
+
+CREATE INDEX ix_stress_snapshots_ts ON stress_snapshots (ts);
+
+-- Hourly downsample (long retention)
+CREATE TABLE stress_snapshots_hourly (
+    station_code VARCHAR(10) NOT NULL,
+    ts BIGINT NOT NULL,
+    samples INTEGER NOT NULL,
+    stress_sum DOUBLE PRECISION NOT NULL,
+    stress_max DOUBLE PRECISION NOT NULL,
+    avg_delay_sum DOUBLE PRECISION NOT NULL,
+    cancellations_max INTEGER NOT NULL,
+    passenger_reports_max INTEGER NOT NULL,
+    PRIMARY KEY (station_code, ts)
+);
@@ -1,22 +1,37 @@
+import os
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
+
+# Cheap bcrypt for tests (must be set before src.auth is imported)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# The startup backfill uses the app's own engine, not the test database
+os.environ.setdefault("ROLLUP_BACKFILL_ON_STARTUP", "false")
 
 from src.main import app
 from src.database import Base, get_db
+from src.async_database import get_async_db, get_async_read_db
+from src import auth, response_cache
+
+# Setup temp SQLite database (a file, so the sync and async engines share it)
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 
-# Setup temp SQLite database
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# WAL so the test session's reads don't block writes made through the app
+@event.listens_for(engine, "connect")
+def _wal(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA journal_mode=WAL")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
+# NullPool: each TestClient runs its own event loop, so async connections aren't reused across them
+async_engine = create_async_engine(SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Creates and drops tables for every test
 @pytest.fixture(scope="function")
@@ -27,7 +42,7 @@ def db_session():
         yield db
     finally:
         db.close()
-        # Destroy tables after test 
+        # Destroy tables after test
         Base.metadata.drop_all(bind=engine)
 
 # Overrides real DB with the test DB to stop contamination
@@ -39,10 +54,18 @@ def client(db_session):
         finally:
             pass
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
-    
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_read_db] = override_get_async_db
+
     with TestClient(app) as test_client:
         yield test_client
-        
+
     # Clean overrides
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+    auth.token_cache.clear()
+    response_cache.cache.clear()
@@ -1,5 +1,8 @@
+import asyncio
 import uuid
 
+import pytest
+
 # Global test data
 test_data = {
     "email_a": f"user_a_{uuid.uuid4().hex[:8]}@railpulse.com",
@@ -195,4 +198,499 @@ def test_validation_missing_fields(client):
         "type": "Crowding"
         # Missing severity entirely
     })
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+def test_board_cache_stats(client):
+    """Cache stats are exposed for the live board cache."""
+    response = client.get("/live/cache/stats")
+    assert response.status_code == 200
+    assert {"hits", "misses", "stale_hits", "ages"} <= set(response.json())
+
+def test_multi_hub_health(client):
+    """Batch health returns one entry per station, in request order, with report counts."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    create_test_incident(client, headers, station="MAN")
+    create_test_incident(client, headers, station="MAN")
+
+    response = client.get("/analytics/health?stations=MAN,YRK,man")
+    assert response.status_code == 200
+    stations = response.json()["stations"]
+    assert [s["station_code"] for s in stations] == ["MAN", "YRK"]
+    assert stations[0]["metrics"]["passenger_reports"] == 2
+    assert stations[0]["metrics"]["avg_report_severity"] == 4
+    assert stations[1]["metrics"]["passenger_reports"] == 0
+
+def test_multi_hub_health_rejects_empty(client):
+    """An empty station list is a client error."""
+    response = client.get("/analytics/health?stations=,")
+    assert response.status_code == 400
+
+def test_hub_health_report_breakdown(client):
+    """Report aggregates include max severity and a per-type breakdown."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    create_test_incident(client, headers, station="MAN")
+    client.post("/incidents", headers=headers, json={
+        "station_code": "MAN", "type": "Antisocial", "severity": 2
+    })
+
+    metrics = client.get("/analytics/MAN/health").json()["metrics"]
+    assert metrics["passenger_reports"] == 2
+    assert metrics["avg_report_severity"] == 3
+    assert metrics["max_report_severity"] == 4
+    assert metrics["reports_by_type"]["Crowding"]["count"] == 1
+    assert metrics["reports_by_type"]["Antisocial"]["max_severity"] == 2
+
+def test_live_departures_served_from_ingestion_store(client):
+    """Routes read boards the poller has stored instead of calling upstream."""
+    from src import ingestion
+    board = asyncio.run(ingestion.StubUpstream(trains_per_board=3).fetch("ZZZ"))
+    ingestion.board_store.put("ZZZ", board)
+    try:
+        departures = client.get("/live/departures/ZZZ").json()
+        health = client.get("/analytics/ZZZ/health").json()
+    finally:
+        ingestion.board_store.clear()
+    assert len(departures) == 3
+    assert health["station"] == "ZZZ (stub)"
+
+def test_authenticated_requests_reuse_verified_token(client):
+    """After the first request, a token resolves without querying the users table."""
+    from sqlalchemy import event
+    from tests.conftest import engine
+
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    client.get("/incidents/my-reports", headers=headers)
+
+    user_queries = []
+    def record(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            user_queries.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/incidents/my-reports", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert user_queries == []
+
+def test_deactivated_user_token_rejected(client, db_session):
+    """Deactivating a user evicts their cached tokens."""
+    from src import models
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    assert client.get("/incidents/my-reports", headers=headers).status_code == 200
+
+    user = db_session.query(models.User).filter(models.User.email == test_data["email_a"]).first()
+    user.is_active = False
+    db_session.commit()
+
+    assert client.get("/incidents/my-reports", headers=headers).status_code == 401
+
+def test_legacy_email_subject_token_accepted(client):
+    """Tokens issued before sub carried the user id still resolve."""
+    from src import auth
+    client.post("/users/register", json={"email": test_data["email_a"], "password": test_data["password_a"]})
+    token = auth.create_access_token(data={"sub": test_data["email_a"]})
+    response = client.get("/incidents/my-reports", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+def test_password_hasher_backpressure():
+    """Jobs beyond the queue bound are refused rather than queued."""
+    from src import auth
+    hasher = auth.PasswordHasher(workers=1, max_queue=0)
+    try:
+        asyncio.run(hasher.hash("secret"))
+        assert False, "expected PasswordHasherBusy"
+    except auth.PasswordHasherBusy:
+        pass
+    assert hasher.stats()["rejected"] == 1
+
+def test_login_rehashes_outdated_hash(client, db_session, monkeypatch):
+    """With rehash-on-login enabled, a hash below the configured cost is upgraded."""
+    from passlib.context import CryptContext
+    from src import auth, models
+    client.post("/users/register", json={"email": test_data["email_a"], "password": test_data["password_a"]})
+    user = db_session.query(models.User).filter(models.User.email == test_data["email_a"]).first()
+    user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(test_data["password_a"])
+    db_session.commit()
+
+    upgraded = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5)
+    monkeypatch.setattr(auth, "AUTH_REHASH_ON_LOGIN", True)
+    monkeypatch.setattr(auth.password_hasher, "context", upgraded)
+
+    response = client.post("/users/login", data={"username": test_data["email_a"], "password": test_data["password_a"]})
+    assert response.status_code == 200
+    db_session.refresh(user)
+    assert user.hashed_password.startswith("$2b$05$")
+
+def test_runtime_status(client):
+    """Runtime stats include the password hashing queue."""
+    response = client.get("/status")
+    assert response.status_code == 200
+    assert "queue_depth" in response.json()["password_hashing"]
+
+def test_bulk_create_incidents(client):
+    """A replayed batch is inserted in one go with per-item results."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    batch = [
+        {"station_code": "MAN", "type": "Crowding", "severity": 3},
+        {"type": "Crowding"},  # missing severity
+        {"station_code": "LDS", "type": "Delay", "severity": 5, "description": "Queued offline"},
+    ]
+    response = client.post("/incidents/bulk", headers=headers, json=batch)
+    assert response.status_code == 207
+    body = response.json()
+    assert body["created"] == 2 and body["failed"] == 1
+    assert [r["status"] for r in body["results"]] == ["created", "invalid", "created"]
+    assert body["results"][0]["incident"]["station_code"] == "MAN"
+    assert body["results"][1]["errors"][0]["loc"] == ["severity"]
+
+    assert len(client.get("/incidents/my-reports", headers=headers).json()) == 2
+
+def test_bulk_create_all_valid(client):
+    """A fully valid batch returns 201."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    batch = [{"type": "Crowding", "severity": 2} for _ in range(25)]
+    response = client.post("/incidents/bulk", headers=headers, json=batch)
+    assert response.status_code == 201
+    assert response.json()["created"] == 25
+    assert len({r["incident"]["id"] for r in response.json()["results"]}) == 25
+
+def test_bulk_create_results_match_their_items(client):
+    """Each result's incident is the one submitted at its index."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    stations = ["LDS", "MAN", "YRK", "KGX", "EUS", "BHM"]
+    batch = []
+    for i in range(30):
+        if i % 7 == 3:
+            batch.append({"type": "Crowding"})  # invalid, shifts the created rows' indexes
+        else:
+            batch.append({"station_code": stations[i % 6], "type": "Delay", "severity": i % 5 + 1, "description": f"item {i}"})
+    response = client.post("/incidents/bulk", headers=headers, json=batch)
+    assert response.status_code == 207
+
+    for result in response.json()["results"]:
+        item = batch[result["index"]]
+        if result["status"] == "invalid":
+            assert "severity" not in item
+            continue
+        incident = result["incident"]
+        assert incident["description"] == item["description"]
+        assert incident["station_code"] == item["station_code"]
+        assert incident["severity"] == item["severity"]
+
+def test_my_reports_keyset_pagination(client):
+    """Pages follow X-Next-Cursor with no gaps or repeats."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    client.post("/incidents/bulk", headers=headers, json=[{"type": "Crowding", "severity": 1}] * 7)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/incidents/my-reports", headers=headers, params=params)
+        assert response.status_code == 200
+        seen.extend(r["id"] for r in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+def test_my_reports_ndjson_stream(client):
+    """Streaming mode yields one JSON object per line."""
+    import json
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    client.post("/incidents/bulk", headers=headers, json=[{"type": "Crowding", "severity": 2}] * 5)
+
+    response = client.get("/incidents/my-reports?stream=true", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 5
+    assert lines[0]["created_at"] >= lines[-1]["created_at"]
+
+def test_my_reports_bad_cursor(client):
+    """A malformed cursor is a client error."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    response = client.get("/incidents/my-reports?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+
+def test_hub_health_tracks_updates_and_deletes(client):
+    """Rollups follow incident edits and deletions."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    keep = create_test_incident(client, headers, station="MAN")
+    drop = create_test_incident(client, headers, station="MAN")
+
+    client.put(f"/incidents/{keep}", headers=headers, json={"type": "Antisocial", "severity": 2})
+    client.delete(f"/incidents/{drop}", headers=headers)
+
+    metrics = client.get("/analytics/MAN/health").json()["metrics"]
+    assert metrics["passenger_reports"] == 1
+    assert metrics["max_report_severity"] == 2
+    assert list(metrics["reports_by_type"]) == ["Antisocial"]
+
+def test_report_trend(client):
+    """The trend endpoint reads per-step points from the rollups."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    client.post("/incidents/bulk", headers=headers, json=[
+        {"station_code": "KGX", "type": "Crowding", "severity": s} for s in (1, 3, 5)
+    ])
+    response = client.get("/analytics/KGX/reports/trend?minutes=60&step=60")
+    assert response.status_code == 200
+    points = response.json()["points"]
+    assert sum(p["count"] for p in points) == 3
+    assert max(p["max_severity"] for p in points) == 5
+    lower = client.get("/analytics/kgx/reports/trend?minutes=60&step=60").json()
+    assert lower["station_code"] == "KGX" and lower["points"] == points
+
+def test_rollup_backfill(db_session):
+    """Backfill rebuilds missing buckets from raw incidents without double counting."""
+    from datetime import datetime, timedelta
+    from src import hub_health, models, rollups
+    user = models.User(email="backfill@railpulse.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    for severity in (2, 4):
+        db_session.add(models.Incident(owner_id=user.id, station_code="YRK", type="Crowding", severity=severity))
+    db_session.commit()
+
+    since = datetime.now() - timedelta(hours=1)
+    rollups.backfill(db_session, since)
+    rollups.backfill(db_session, since)
+    stats = hub_health.recent_report_stats(db_session, ["YRK"])["YRK"]
+    assert stats["count"] == 2
+    assert stats["avg_severity"] == 3
+
+def _health_sample(code, stress):
+    return {
+        "station_code": code, "stress_index": stress, "hub_status": "GREEN",
+        "metrics": {"cancellations": 1, "avg_delay": 2.0, "passenger_reports": 0, "avg_report_severity": 0},
+    }
+
+def test_stress_history_raw_and_compacted(client, db_session):
+    """History points agree before and after hourly compaction."""
+    from datetime import datetime, timezone
+    from src import history
+    hour = 1_700_000_000 - 1_700_000_000 % 3600
+    for minute in range(0, 120, 10):
+        history.record_snapshots(db_session, [_health_sample("LDS", minute / 200)], ts=hour + minute * 60)
+
+    def fetch():
+        params = {
+            "from": datetime.fromtimestamp(hour, tz=timezone.utc).isoformat(),
+            "to": datetime.fromtimestamp(hour + 7200, tz=timezone.utc).isoformat(),
+            "step": 3600,
+        }
+        response = client.get("/analytics/LDS/history", params=params)
+        assert response.status_code == 200
+        return response.json()["points"]
+
+    before = fetch()
+    assert [p["samples"] for p in before] == [6, 6]
+
+    history.compact(db_session, now=hour + 7200)
+    after = fetch()
+    assert after == before
+    assert db_session.query(history.hourly_table).count() == 2
+
+def test_stress_history_rejects_too_many_points(client):
+    """Requests are capped at HISTORY_MAX_POINTS points."""
+    response = client.get("/analytics/LDS/history", params={
+        "from": "2026-01-01T00:00:00", "to": "2026-12-31T00:00:00", "step": 60,
+    })
+    assert response.status_code == 400
+
+def test_live_feed_fans_out_one_computation(db_session):
+    """Every subscriber of a station gets the same encoded events, and only when they change."""
+    from src import ingestion, live_feed
+    stub = ingestion.StubUpstream(trains_per_board=3)
+    ingestion.board_store.put("ZZZ", asyncio.run(stub.fetch("ZZZ")))
+    feed = live_feed.LiveFeed(session_factory=lambda: db_session)
+
+    async def scenario():
+        first = feed.subscribe(["ZZZ"])
+        second = feed.subscribe(["ZZZ"])
+        received = [await asyncio.wait_for(first.queue.get(), 5) for _ in range(2)]
+        await feed.stop()
+        assert feed.stats()["subscribers"] == 2
+        assert [second.queue.get_nowait() for _ in range(2)] == received
+        # Nothing changed, so a recompute publishes nothing
+        await feed.refresh_once()
+        assert first.queue.empty() and second.queue.empty()
+        # A new board reaches connected clients as a diff
+        ingestion.board_store.put("ZZZ", await stub.fetch("ZZZ"))
+        await feed.refresh_once()
+        messages = [first.queue.get_nowait() for _ in range(first.queue.qsize())]
+        assert any(m.startswith(b"event: changes\n") for m in messages)
+        feed.unsubscribe(first)
+        feed.unsubscribe(second)
+        return received
+
+    try:
+        health, departures = asyncio.run(scenario())
+    finally:
+        ingestion.board_store.clear()
+    assert health.startswith(b"event: health\ndata: ") and b'"station_code":"ZZZ"' in health
+    assert departures.startswith(b"event: departures\ndata: ") and departures.endswith(b"\n\n")
+    assert feed.stats()["subscribers"] == 0
+
+def test_live_stream_rejects_empty(client):
+    """A stream needs at least one station."""
+    assert client.get("/live/stream?stations=,").status_code == 400
+
+def test_departure_changes_since_version(client):
+    """Clients holding a board version get only what changed since it."""
+    from src import ingestion
+    stub = ingestion.StubUpstream(trains_per_board=4)
+    ingestion.board_store.put("ZZZ", asyncio.run(stub.fetch("ZZZ")))
+    try:
+        first = client.get("/live/departures/ZZZ")
+        version = int(first.headers["X-Board-Version"])
+        full = client.get("/live/departures/ZZZ/changes").json()
+        ingestion.board_store.put("ZZZ", asyncio.run(stub.fetch("ZZZ")))
+        delta = client.get(f"/live/departures/ZZZ/changes?since={version}").json()
+    finally:
+        ingestion.board_store.clear()
+    assert full["full"] is True and len(full["trains"]) == 4
+    assert delta["full"] is False
+    assert delta["version"] not in (0, version)
+    assert delta["added"] == [] and delta["removed"] == []
+    assert all("key" in change for change in delta["changed"])
+
+def test_unavailable_station_keeps_its_version(client, monkeypatch):
+    """Repeated requests for a station with no data don't mint new board versions."""
+    from src import ingestion, rail_service
+    from src.board import Board
+
+    async def unavailable(hub_code="LDS"):
+        return Board("Unknown")
+    monkeypatch.setattr(rail_service, "get_live_arrivals_async", unavailable)
+
+    first = client.get("/live/departures/QQQ")
+    again = client.get("/live/departures/QQQ")
+    changes = client.get("/live/departures/QQQ/changes").json()
+    assert first.headers["X-Board-Freshness"] == "unavailable"
+    assert again.headers["X-Board-Version"] == first.headers["X-Board-Version"]
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert ingestion.board_store.history.version("QQQ") == 0
+    assert changes["freshness"] == "unavailable" and changes["trains"] == []
+
+def test_departures_conditional_get(client, monkeypatch):
+    """A matching If-None-Match gets a 304 without reaching the board layer."""
+    from src import ingestion
+    ingestion.board_store.put("ZZZ", asyncio.run(ingestion.StubUpstream(trains_per_board=3).fetch("ZZZ")))
+    try:
+        first = client.get("/live/departures/ZZZ")
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"].startswith("public, max-age=")
+
+        async def no_fetch(code):
+            raise AssertionError("board layer touched")
+        monkeypatch.setattr(ingestion, "get_board", no_fetch)
+        cached = client.get("/live/departures/ZZZ", headers={"If-None-Match": etag})
+    finally:
+        ingestion.board_store.clear()
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+def test_hub_health_cache_invalidated_by_reports(client):
+    """Cached health is reused until a report for the station changes it."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    first = client.get("/analytics/LDS/health")
+    again = client.get("/analytics/LDS/health", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+    create_test_incident(client, headers, station="LDS")
+    fresh = client.get("/analytics/LDS/health", headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert fresh.json()["metrics"]["passenger_reports"] == 1
+
+def test_hub_health_station_code_case_insensitive(client):
+    """Mixed-case codes share one cached health body, computed for the upper-case station."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    create_test_incident(client, headers, station="MAN")
+    lower = client.get("/analytics/man/health").json()
+    upper = client.get("/analytics/MAN/health").json()
+    assert lower["station_code"] == upper["station_code"] == "MAN"
+    assert lower["metrics"]["passenger_reports"] == upper["metrics"]["passenger_reports"] == 1
+
+def test_lower_case_report_counts_towards_station_health(client):
+    """Reports filed with a lower-case code are stored upper-case and counted on both spellings."""
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    created = client.post("/incidents/bulk", headers=headers, json=[{"station_code": "yrk", "type": "Crowding", "severity": 2}])
+    assert created.json()["results"][0]["incident"]["station_code"] == "YRK"
+    create_test_incident(client, headers, station="yrk")
+    for code in ("yrk", "YRK"):
+        assert client.get(f"/analytics/{code}/health").json()["metrics"]["passenger_reports"] == 2
+
+def test_fast_json_matches_default_serialization(client, monkeypatch):
+    """FAST_JSON bodies carry the same data as the validated response_model path."""
+    from src import serialization
+    headers = setup_user(client, test_data["email_a"], test_data["password_a"])
+    for station in ("LDS", "MAN", "YRK"):
+        create_test_incident(client, headers, station=station)
+
+    default = client.get("/incidents/my-reports?limit=2", headers=headers)
+    monkeypatch.setattr(serialization, "FAST_JSON", True)
+    fast = client.get("/incidents/my-reports?limit=2", headers=headers)
+    fast_stream = client.get("/incidents/my-reports?stream=true", headers=headers)
+
+    assert fast.json() == default.json()
+    assert fast.headers["X-Next-Cursor"] == default.headers["X-Next-Cursor"]
+    assert [line for line in fast_stream.text.splitlines() if line][:2] == [
+        serialization.dumps(row).decode() for row in default.json()
+    ]
+
+def test_db_pool_records_waits_and_timeouts(tmp_path):
+    """The timed pool counts checkouts and checkout timeouts."""
+    from sqlalchemy import create_engine, exc
+    from src import database
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=database.TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    database.pool_metrics.reset()
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    engine.dispose()
+    stats = database.pool_metrics.stats()
+    assert stats["checkouts"] == 1
+    assert stats["timeouts"] == 1
+
+def test_read_only_session_rejects_writes():
+    """Read-only sessions refuse to flush."""
+    from src import database, models
+    db = database.ReadSessionLocal()
+    try:
+        db.add(models.User(email="ro@railpulse.com", hashed_password="x"))
+        with pytest.raises(RuntimeError):
+            db.flush()
+    finally:
+        db.close()
+
+def test_metrics_endpoint_reports_routes_and_stages(client):
+    """/metrics exposes per-route latency, stage timings and cache gauges."""
+    setup_user(client, test_data["email_a"], test_data["password_a"])
+    body = client.get("/metrics").text
+    assert 'railpulse_request_duration_seconds_count{method="POST",route="/users/login",status="200"}' in body
+    assert 'railpulse_stage_duration_seconds_count{stage="password_hash"}' in body
+    assert 'railpulse_stage_duration_seconds_count{stage="db"}' in body
+    assert "railpulse_response_cache_hit_ratio" in body
+    assert "railpulse_db_pool_checkouts" in body
+
+def test_slow_request_sampler_keeps_stage_breakdown(client, monkeypatch):
+    """Requests over the threshold are sampled with time per stage."""
+    from src import metrics
+    sampler = metrics.SlowRequestSampler(threshold_ms=0.001)
+    monkeypatch.setattr(metrics, "slow_requests", sampler)
+    setup_user(client, test_data["email_a"], test_data["password_a"])
+    login = [s for s in sampler.samples if s["route"] == "/users/login"][-1]
+    assert login["status"] == 200
+    assert login["stages_ms"]["password_hash"] > 0
+    assert "db" in login["stages_ms"]
@@ -0,0 +1,663 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from src import delays, rail_service
+from src.board import Board, CANCELLED, DELAYED, ON_TIME
+from src.board_cache import BoardCache
+from src.board_diff import BoardHistory, board_version, diff_boards
+from src.ingestion import BoardPoller, BoardStore, StubUpstream
+from src.rate_limit import BACKGROUND, USER, FileBucket, LocalBucket, RateLimited, RateLimiter
+from src.resilience import CircuitBreaker, CircuitBreakerGroup, CircuitOpen
+from src.shared_board_cache import SharedMemoryBackend
+from src.singleflight import AsyncSingleFlight, SingleFlight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_loader(calls, fail=False):
+    def loader(code):
+        calls.append(code)
+        if fail:
+            raise RuntimeError("upstream down")
+        return {"station_name": code, "trains": [], "n": len(calls)}
+    return loader
+
+
+def test_cache_hit_within_ttl():
+    """Second lookup inside the TTL never reaches the loader."""
+    clock = FakeClock()
+    cache = BoardCache(ttl=30, stale_ttl=60, clock=clock)
+    calls = []
+    cache.get_or_load("LDS", make_loader(calls))
+    clock.now += 10
+    board = cache.get_or_load("LDS", make_loader(calls))
+    assert calls == ["LDS"]
+    assert board["n"] == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_cache_serves_stale_and_refreshes_once():
+    """A stale board is returned immediately while one background refresh runs."""
+    clock = FakeClock()
+    cache = BoardCache(ttl=30, stale_ttl=60, clock=clock)
+    calls = []
+    cache.get_or_load("LDS", make_loader(calls))
+    clock.now += 45
+
+    gate = threading.Event()
+    def slow_loader(code):
+        gate.wait(2)
+        calls.append(code)
+        return {"station_name": code, "trains": [], "n": 2}
+
+    first = cache.get_or_load("LDS", slow_loader)
+    second = cache.get_or_load("LDS", slow_loader)
+    assert first["n"] == 1 and second["n"] == 1
+    assert cache.stats()["refreshing"] == ["LDS"]
+
+    gate.set()
+    for _ in range(100):
+        if not cache.stats()["refreshing"]:
+            break
+        threading.Event().wait(0.01)
+    assert calls == ["LDS", "LDS"]
+    assert cache.get("LDS")[0]["n"] == 2
+    assert cache.stats()["stale_hits"] == 2
+
+def test_cache_expired_board_is_a_miss():
+    """Past ttl + stale_ttl the loader runs inline."""
+    clock = FakeClock()
+    cache = BoardCache(ttl=30, stale_ttl=60, clock=clock)
+    calls = []
+    cache.get_or_load("LDS", make_loader(calls))
+    clock.now += 100
+    board = cache.get_or_load("LDS", make_loader(calls))
+    assert board["n"] == 2
+    assert cache.stats()["misses"] == 2
+
+def test_cache_lru_eviction():
+    """The least recently used station is evicted first."""
+    cache = BoardCache(max_entries=2, clock=FakeClock())
+    calls = []
+    cache.get_or_load("LDS", make_loader(calls))
+    cache.get_or_load("MAN", make_loader(calls))
+    cache.get_or_load("LDS", make_loader(calls))
+    cache.get_or_load("KGX", make_loader(calls))
+    assert cache.get("MAN") == (None, None)
+    assert cache.get("LDS")[0] is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_cache_does_not_store_failures():
+    """Upstream errors propagate and leave nothing behind."""
+    cache = BoardCache(clock=FakeClock())
+    calls = []
+    try:
+        cache.get_or_load("LDS", make_loader(calls, fail=True))
+    except RuntimeError:
+        pass
+    assert cache.stats()["entries"] == 0
+
+
+def _run_concurrently(n, target):
+    results, errors = [], []
+    def worker():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+def _wait_until(condition, timeout=2.0):
+    # Fails the test instead of hanging the run when the condition never holds
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for concurrent callers"
+        threading.Event().wait(0.005)
+
+def _join_all(threads, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    for t in threads:
+        t.join(max(0.0, deadline - time.monotonic()))
+    assert not any(t.is_alive() for t in threads), "worker threads did not finish"
+
+def test_single_flight_coalesces_concurrent_calls():
+    """N concurrent callers for one key trigger exactly one execution."""
+    flights = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def fetch(code):
+        calls.append(code)
+        gate.wait(2)
+        return {"station_name": code}
+
+    threads, results, errors = _run_concurrently(10, lambda: flights.do("LDS", fetch, "LDS"))
+    _wait_until(lambda: flights.stats()["coalesced"] >= 9)
+    gate.set()
+    _join_all(threads)
+
+    assert calls == ["LDS"]
+    assert len(results) == 10 and not errors
+    assert all(r is results[0] for r in results)
+    assert flights.stats()["in_flight"] == []
+
+def test_single_flight_shares_failures():
+    """Every waiter receives the leader's exception."""
+    flights = SingleFlight()
+    gate = threading.Event()
+
+    def fetch(code):
+        gate.wait(2)
+        raise RuntimeError("upstream down")
+
+    threads, results, errors = _run_concurrently(5, lambda: flights.do("MAN", fetch, "MAN"))
+    _wait_until(lambda: flights.stats()["coalesced"] >= 4)
+    gate.set()
+    _join_all(threads)
+
+    assert not results
+    assert len(errors) == 5
+    assert flights.stats()["executions"] == 1
+
+def test_async_single_flight_coalesces():
+    """Concurrent coroutines for one station share one fetch."""
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def fetch(code):
+        calls.append(code)
+        await asyncio.sleep(0.01)
+        return {"station_name": code}
+
+    async def main():
+        return await asyncio.gather(*(flights.do("KGX", fetch, "KGX") for _ in range(20)))
+
+    results = asyncio.run(main())
+    assert calls == ["KGX"]
+    assert len(results) == 20
+    assert flights.stats()["coalesced"] == 19
+
+def test_async_cache_hit_skips_loader():
+    """aget_or_load shares the TTL semantics of the sync path."""
+    cache = BoardCache(ttl=30, clock=FakeClock())
+    calls = []
+
+    async def loader(code):
+        calls.append(code)
+        return {"station_name": code, "trains": []}
+
+    async def main():
+        await cache.aget_or_load("LDS", loader)
+        return await cache.aget_or_load("LDS", loader)
+
+    assert asyncio.run(main())["station_name"] == "LDS"
+    assert calls == ["LDS"]
+
+def test_fetch_live_arrivals_async_parses_board(monkeypatch):
+    """The async client parses Huxley payloads like the sync path."""
+    payload = {
+        "locationName": "Leeds",
+        "trainServices": [{
+            "origin": [{"crs": "YRK", "locationName": "York"}],
+            "sta": "10:00", "eta": "10:20", "operator": "Northern", "serviceId": "S1",
+        }],
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=payload))
+
+    monkeypatch.setattr(rail_service, "breaker", CircuitBreaker())
+
+    async def main():
+        client = httpx.AsyncClient(transport=transport)
+        monkeypatch.setattr(rail_service, "_get_async_client", lambda: (client, asyncio.Semaphore(1)))
+        try:
+            return await rail_service.fetch_live_arrivals_async("LDS")
+        finally:
+            await client.aclose()
+
+    board = asyncio.run(main())
+    assert board.station_name == "Leeds"
+    assert board.row(0)["delay_weight"] == 20
+    assert board.row(0)["refund_eligible"] is True
+
+def test_async_client_closed_and_not_reused_across_loops():
+    """The lifespan's client is closed on shutdown and never handed to another event loop."""
+    async def app_loop():
+        await rail_service.aopen()
+        client = rail_service._async_client
+        assert rail_service._get_async_client()[0] is client
+        await rail_service.aclose()
+        return client
+
+    async def other_loop():
+        return rail_service._get_async_client()
+
+    assert asyncio.run(app_loop()).is_closed
+    assert rail_service._async_client is None
+    assert asyncio.run(other_loop()) is None
+
+def test_poller_fills_store_from_stub():
+    """One sweep fetches every watched station into the store."""
+    store = BoardStore()
+    stub = StubUpstream(trains_per_board=5)
+    poller = BoardPoller(store, ["LDS", "MAN"], stub.fetch, max_rps=0)
+
+    asyncio.run(poller.poll_once())
+    assert stub.calls == 2
+    assert len(store.get("LDS")) == 5
+    assert store.entry("MAN")["version"] == board_version(store.get("MAN"))
+    assert poller.stats()["fetches"] == 2
+
+def test_poller_keeps_last_board_on_error():
+    """A failed fetch leaves the previous board in place, served as a stale copy."""
+    store = BoardStore()
+    previous = Board("Leeds", fetched_at=1.0)
+    store.put("LDS", previous)
+
+    async def failing(code):
+        raise RuntimeError("upstream down")
+
+    poller = BoardPoller(store, ["LDS"], failing, max_rps=0)
+    asyncio.run(poller.poll_once())
+    assert store.get("LDS").station_name == "Leeds"
+    assert store.get("LDS").freshness() == "stale"
+    assert previous.freshness() == "live"  # readers holding the old object are unaffected
+    assert poller.stats()["errors"] == 1
+
+def test_store_max_age():
+    """Boards older than max_age are reported missing."""
+    clock = FakeClock()
+    store = BoardStore(clock=clock)
+    store.put("LDS", Board("Leeds"))
+    clock.now += 100
+    assert store.get("LDS", max_age=60) is None
+    assert store.get("LDS", max_age=120) is not None
+
+def _sample_board():
+    board = Board("Leeds")
+    board.append("YRK", "York", "10:00", "On time", ON_TIME, 0, platform="1", operator="Northern", train_id="A")
+    board.append("MAN", "Manchester", "10:05", "10:25", DELAYED, 20, platform="2", operator="TPE", train_id="B")
+    board.append("KGX", "London Kings Cross", "10:10", "Cancelled", CANCELLED, 60, operator="LNER", train_id="C")
+    return board
+
+def test_board_metrics_single_pass():
+    """Cancelled trains are excluded from the average delay."""
+    metrics = _sample_board().metrics()
+    assert metrics == {"trains": 3, "cancellations": 1, "avg_delay": 10}
+
+def test_board_json_matches_rows():
+    """The column-wise JSON encoder produces the same payload as the per-train dicts."""
+    import json
+    board = _sample_board()
+    board.append("LDS", 'Quote "Town"', None, None, ON_TIME, 0)
+    assert json.loads(board.to_json()) == board.rows()
+    assert board.rows()[1]["refund_eligible"] is True
+    assert board.rows()[2]["status"] == "Cancelled"
+
+def test_delay_classification():
+    """Clock times, enumerated states, midnight wraparound and junk input."""
+    assert delays.parse_hhmm("07:30") == 450
+    assert delays.parse_hhmm("24:00") is None
+    assert delays.classify("10:00", "10:12") == (DELAYED, 12)
+    assert delays.classify("10:00", "09:58") == (ON_TIME, 0)
+    assert delays.classify("23:50", "00:10") == (DELAYED, 20)
+    assert delays.classify("10:00", "On time") == (ON_TIME, 0)
+    assert delays.classify("10:00", "Cancelled") == (CANCELLED, 60)
+    assert delays.classify("10:00", "Delayed") == (DELAYED, 0)
+    assert delays.classify(None, "10:05") == (ON_TIME, 0)
+    assert delays.classify("10:00", "No report") == (ON_TIME, 0)
+
+def test_delay_classify_many_matches_classify():
+    """The batched path agrees with the per-train path."""
+    scheduled = ["10:00", "23:50", "10:00", "10:00", None, "12:00"]
+    estimated = ["10:12", "00:10", "Cancelled", "Delayed", "10:05", "11:59"]
+    statuses, minutes = delays.classify_many(scheduled, estimated)
+    expected = [delays.classify(s, e) for s, e in zip(scheduled, estimated)]
+    assert list(zip(statuses, minutes)) == expected
+
+def test_board_diff_keyed_by_service():
+    """Diffs list added trains, removed keys and only the fields that changed."""
+    old = _sample_board()
+    new = Board("Leeds")
+    new.append("YRK", "York", "10:00", "10:04", DELAYED, 4, platform="3", operator="Northern", train_id="A")
+    new.append("KGX", "London Kings Cross", "10:10", "Cancelled", CANCELLED, 60, operator="LNER", train_id="C")
+    new.append("EDB", "Edinburgh", "10:15", "On time", ON_TIME, 0, operator="LNER", train_id="D")
+
+    diff = diff_boards(old, new)
+    assert [row["key"] for row in diff["added"]] == ["D"]
+    assert diff["removed"] == ["B"]
+    assert diff["changed"] == [{
+        "estimated": "10:04", "status": "Delayed", "delay_weight": 4, "platform": "3", "key": "A",
+    }]
+
+def test_board_history_changes_since():
+    """Known versions get a diff; unknown ones (or unchanged boards) don't bump or diff."""
+    history = BoardHistory(versions=2)
+    first, second, third = _sample_board(), _sample_board(), _sample_board()
+    first.fetched_at, second.fetched_at, third.fetched_at = 1.0, 2.0, 3.0
+    v1 = history.record("LDS", first)
+    assert history.record("LDS", first) == v1
+    v2 = history.record("LDS", second)
+    v3 = history.record("LDS", third)
+    assert len({v1, v2, v3}) == 3
+
+    version, board, diff = history.changes("LDS", v2)
+    assert (version, board) == (v3, third)
+    assert diff == {"added": [], "removed": [], "changed": []}
+    assert history.changes("LDS", v1)[2] is None
+    assert history.changes("LDS", None)[2] is None
+    # A stale copy is a new version
+    assert history.record("LDS", third.as_stale()) != v3
+
+def test_board_versions_agree_across_histories():
+    """Versions come from the board, so another worker's (or a restarted one's) `since` never diffs the wrong board."""
+    worker_a, worker_b = BoardHistory(), BoardHistory()
+    seen_by_a, seen_by_b, shared = _sample_board(), _sample_board(), _sample_board()
+    seen_by_a.fetched_at, seen_by_b.fetched_at, shared.fetched_at = 1.0, 2.0, 3.0
+    foreign = worker_a.record("LDS", seen_by_a)
+    worker_b.record("LDS", seen_by_b)
+    assert worker_b.changes("LDS", foreign)[2] is None  # unknown here: full board
+
+    # Both workers holding the same board (e.g. through the shared cache) give it the same version
+    since = worker_a.record("LDS", shared)
+    assert worker_b.record("LDS", Board.from_bytes(shared.to_bytes())) == since
+    assert worker_b.changes("LDS", since)[2] == {"added": [], "removed": [], "changed": []}
+
+def test_fake_huxley_serves_parseable_boards():
+    """The benchmark stand-in speaks Huxley's board format."""
+    from fastapi.testclient import TestClient
+    from benchmarks.fake_huxley import create_app
+    client = TestClient(create_app(trains=8))
+    board = rail_service.parse_board(client.get("/all/LDS/5").json(), "LDS")
+    assert len(board) == 5
+    assert board.station_name == "LDS (stub)"
+
+
+def test_upstream_outcomes_counted(monkeypatch):
+    """Huxley calls are counted as ok, error or timeout."""
+    from src import metrics
+    responses = iter([httpx.Response(200, json={"locationName": "Leeds"}), httpx.Response(503)])
+
+    def handler(request):
+        response = next(responses, None)
+        if response is None:
+            raise httpx.ReadTimeout("slow", request=request)
+        return response
+
+    monkeypatch.setattr(rail_service, "HUXLEY_RETRIES", 0)
+    monkeypatch.setattr(rail_service, "breaker", CircuitBreaker())
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(rail_service, "_get_async_client", lambda: (client, asyncio.Semaphore(1)))
+        try:
+            await rail_service.fetch_live_arrivals_async("LDS")
+            for _ in range(2):
+                try:
+                    await rail_service.fetch_live_arrivals_async("LDS")
+                except httpx.HTTPError:
+                    pass
+        finally:
+            await client.aclose()
+
+    before = {outcome: metrics.upstream_requests.value(outcome) for outcome in ("ok", "error", "timeout")}
+    asyncio.run(main())
+    assert {outcome: metrics.upstream_requests.value(outcome) - before[outcome] for outcome in before} == {
+        "ok": 1, "error": 1, "timeout": 1,
+    }
+
+
+def test_circuit_breaker_opens_and_probes():
+    """Consecutive failures open the circuit; one probe after the reset timeout decides."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    clock.now += 11
+    breaker.before_call()  # the probe
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # everyone else still fails fast
+    breaker.record_success()
+    breaker.before_call()
+    assert breaker.stats()["state"] == "closed"
+    assert breaker.stats()["rejected"] == 2
+
+
+def _huxley(handler, monkeypatch):
+    # Runs fetch_live_arrivals_async against a MockTransport with fresh breakers
+    monkeypatch.setattr(rail_service, "HUXLEY_RETRY_BASE", 0.001)
+    monkeypatch.setattr(rail_service, "breaker", CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(rail_service, "station_breakers", CircuitBreakerGroup(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(rail_service, "rate_limiter", None)
+
+    async def fetch(code):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(rail_service, "_get_async_client", lambda: (client, asyncio.Semaphore(1)))
+        try:
+            return await rail_service.fetch_live_arrivals_async(code)
+        finally:
+            await client.aclose()
+    return fetch
+
+
+def test_upstream_retries_transient_errors(monkeypatch):
+    """5xx answers are retried with backoff; 4xx are not."""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"locationName": "Leeds"})
+
+    fetch = _huxley(handler, monkeypatch)
+    assert asyncio.run(fetch("LDS")).station_name == "Leeds"
+    assert len(calls) == 3
+
+    calls.clear()
+    fetch = _huxley(lambda request: calls.append(1) or httpx.Response(404), monkeypatch)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fetch("LDS"))
+    assert len(calls) == 1
+    assert rail_service.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_upstream_deadline_caps_slow_calls(monkeypatch):
+    """A hanging upstream is cut off at the per-call deadline."""
+    async def hang(request):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(rail_service, "HUXLEY_DEADLINE", 0.05)
+    fetch = _huxley(hang, monkeypatch)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(fetch("LDS"))
+    assert time.monotonic() - started < 1
+
+
+def test_failed_fetch_falls_back_to_last_good_board(monkeypatch):
+    """Outages serve the last good board marked stale, or an unavailable board - never a healthy empty one."""
+    def unreachable(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    fetch = _huxley(unreachable, monkeypatch)
+    monkeypatch.setattr(rail_service, "HUXLEY_RETRIES", 0)
+    monkeypatch.setattr(rail_service, "load_board_async", fetch)
+    cache = BoardCache(ttl=0, stale_ttl=0)
+    monkeypatch.setattr(rail_service, "board_cache", cache)
+
+    good = rail_service.parse_board({"locationName": "Leeds"}, "LDS")
+    cache.set("LDS", good)
+    board = asyncio.run(rail_service.get_live_arrivals_async("LDS"))
+    assert board.freshness() == "stale" and board.rows() == good.rows()
+    # A flagged copy: the board other requests hold keeps its freshness, and repeats return the same copy
+    assert good.freshness() == "live"
+    assert asyncio.run(rail_service.get_live_arrivals_async("LDS")) is board
+
+    missing = asyncio.run(rail_service.get_live_arrivals_async("MAN"))
+    assert missing.freshness() == "unavailable"
+    # Two connection failures opened the shared circuit: the next call fails fast without going upstream
+    with pytest.raises(CircuitOpen):
+        asyncio.run(fetch("YRK"))
+
+    from src import hub_health
+    health = hub_health.compute_hub_health("MAN", missing, {"count": 0, "avg_severity": 0})
+    assert health["hub_status"] == "UNKNOWN"
+    assert health["feed"]["status"] == "unavailable"
+
+
+def test_station_errors_do_not_open_the_shared_circuit(monkeypatch):
+    """5xx answers for a bogus station trip only that station's breaker."""
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if "/XXX/" in request.url.path:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"locationName": "Leeds"})
+
+    fetch = _huxley(handler, monkeypatch)
+    monkeypatch.setattr(rail_service, "HUXLEY_RETRIES", 0)
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            asyncio.run(fetch("XXX"))
+        assert asyncio.run(fetch("LDS")).station_name == "Leeds"
+    with pytest.raises(CircuitOpen):
+        asyncio.run(fetch("XXX"))
+
+    assert asyncio.run(fetch("MAN")).station_name == "Leeds"
+
+    assert len(calls) == 5
+    assert rail_service.breaker.stats()["state"] == "closed"
+    assert rail_service.station_breakers.stats()["not_closed"] == ["XXX"]
+
+def test_station_refusal_releases_the_shared_probe(monkeypatch):
+    """A shared half-open probe refused by the station's breaker goes back for the next caller."""
+    clock = FakeClock()
+    shared = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    stations = CircuitBreakerGroup(failure_threshold=1, reset_timeout=60, clock=clock)
+    monkeypatch.setattr(rail_service, "breaker", shared)
+    monkeypatch.setattr(rail_service, "station_breakers", stations)
+    shared.record_failure()
+    stations.get("XXX").record_failure()
+    clock.now += 11  # shared breaker due a probe; XXX's still open
+
+    with pytest.raises(CircuitOpen):
+        rail_service._admit("XXX")
+    rail_service._admit("LDS")  # takes the probe XXX was refused
+    assert shared.stats()["state"] == "half_open"
+    assert stations.get("LDS").stats()["state"] == "closed"
+
+def test_rate_limiter_reserves_tokens_for_user_lane():
+    """Background fetches leave the reserve; user fetches can spend it."""
+    clock = FakeClock()
+    limiter = RateLimiter(rate=1, capacity=4, reserve=2, backend=LocalBucket(4, clock=clock))
+    limiter.acquire(0, lane=BACKGROUND)
+    limiter.acquire(0, lane=BACKGROUND)
+    with pytest.raises(RateLimited):
+        limiter.acquire(0.5, lane=BACKGROUND)
+    limiter.acquire(0, lane=USER)
+    limiter.acquire(0, lane=USER)
+    with pytest.raises(RateLimited):
+        limiter.acquire(0, lane=USER)
+
+    clock.now += 1  # one token back: users may take it, background may not
+    limiter.acquire(0)
+    stats = limiter.stats()
+    assert stats["granted"] == {"user": 3, "background": 2}
+    assert stats["rejected"] == {"user": 1, "background": 1}
+
+
+def test_file_bucket_shared_between_workers(tmp_path):
+    """Two buckets on the same file (as two workers would) draw from one budget."""
+    path = str(tmp_path / "huxley.bucket")
+    clock = FakeClock()
+    first, second = FileBucket(path, 3, clock=clock), FileBucket(path, 3, clock=clock)
+    try:
+        waits = [bucket.take(1, 3, 0) for bucket in (first, second, first, second)]
+        assert waits[:3] == [0, 0, 0]
+        assert waits[3] == pytest.approx(1.0)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_rate_limited_fetch_skips_upstream_and_breaker(monkeypatch):
+    """Out of quota, a fetch fails fast without calling Huxley or counting against the breaker."""
+    calls = []
+    fetch = _huxley(lambda request: calls.append(1) or httpx.Response(200, json={}), monkeypatch)
+    limiter = RateLimiter(rate=0.01, capacity=1)
+    monkeypatch.setattr(rail_service, "rate_limiter", limiter)
+    monkeypatch.setattr(rail_service, "HUXLEY_DEADLINE", 0.1)
+    asyncio.run(fetch("LDS"))
+    with pytest.raises(RateLimited):
+        asyncio.run(fetch("LDS"))
+    assert len(calls) == 1
+    assert rail_service.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_board_bytes_round_trip():
+    """The compact encoding restores every column."""
+    board = asyncio.run(StubUpstream(trains_per_board=5).fetch("LDS"))
+    data = board.to_bytes()
+    copy = Board.from_bytes(memoryview(data))
+    assert copy.rows() == board.rows()
+    assert copy.to_json() == board.to_json()
+    assert copy.fetched_at == board.fetched_at
+    assert len(data) < len(board.to_json())
+
+
+def test_shared_board_cache_across_workers(tmp_path):
+    """Two caches on one segment (as two workers) share boards, stale flags and refresh claims."""
+    path = str(tmp_path / "boards")
+    clock = FakeClock()
+    first = BoardCache(ttl=30, stale_ttl=60, clock=clock, backend=SharedMemoryBackend(path, slots=8, slot_size=8192))
+    second = BoardCache(ttl=30, stale_ttl=60, clock=clock, backend=SharedMemoryBackend(path, slots=8, slot_size=8192))
+    stub = StubUpstream(trains_per_board=5)
+    try:
+        calls = []
+        def loader(code):
+            calls.append(code)
+            return asyncio.run(stub.fetch(code))
+
+        board = first.get_or_load("LDS", loader)
+        seen = second.get_or_load("LDS", loader)
+        assert calls == ["LDS"]
+        assert seen.rows() == board.rows()
+        # Repeated reads hand back the same object until the slot is rewritten
+        assert second.get_or_load("LDS", loader) is seen
+
+        first.mark_stale("LDS")
+        stale = second.get("LDS")[0]
+        assert stale.freshness() == "stale" and seen.freshness() == "live"
+        assert second.get("LDS")[0] is stale
+
+        # Only one worker claims the refresh of a stale board
+        clock.now += 45
+        assert first.backend.claim_refresh("LDS", clock.now, clock.now + 30)
+        assert not second.backend.claim_refresh("LDS", clock.now, clock.now + 30)
+
+        # Keys that aren't CRS codes still work (hashed)
+        first.set("NOT-A-CRS-CODE", board)
+        assert second.get("NOT-A-CRS-CODE")[0].rows() == board.rows()
+        second.invalidate()
+        assert first.get("LDS") == (None, None)
+    finally:
+        first.backend.close()
+        second.backend.close()